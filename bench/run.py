@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Capture-to-URL benchmarks for the plugins, against stub capture tools and a local upload server.
+
+Each scenario runs a plugin end to end as a subprocess, with bench/stubs first on PATH, a throwaway
+HOME with its own config, and EZSHOT_UPLOAD_URL pointing at bench/server.py. For each scenario it
+reports the fastest wall time, the per-stage times from --startup-report and the pipeline's stage
+timings, peak RSS (of the plugin and everything it ran, from wait4), and the bytes the server
+received. Results are compared against bench/baselines.json. Wall times are scaled by how long a fixed
+calibration workload takes on this machine compared with the one that recorded the baselines, so a
+slower or busier machine doesn't read as a regression:
+
+    python3 bench/run.py                   # run everything, compare with the baselines
+    python3 bench/run.py -k 4k --repeat 5  # only scenarios whose name contains "4k"
+    python3 bench/run.py --save            # record the current numbers as the new baselines
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import server
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+PLUGINS_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'plugins')
+STUBS_DIR = os.path.join(BENCH_DIR, 'stubs')
+BASELINES_FILE = os.path.join(BENCH_DIR, 'baselines.json')
+
+LAYOUTS = {
+    '1080p': 'DP-1:1920x1080',
+    '4k': 'DP-1:3840x2160',
+    '3x4k': 'DP-1:3840x2160,DP-2:3840x2160,DP-3:3840x2160',
+}
+
+# name, plugin, layout, arguments, config overrides
+SCENARIOS = [
+    ('grim-full-1080p', 'e-z-grim.py', '1080p', ['-f'], {}),
+    ('grim-full-4k', 'e-z-grim.py', '4k', ['-f'], {}),
+    ('grim-full-3x4k', 'e-z-grim.py', '3x4k', ['-f'], {}),
+    ('grim-region-4k', 'e-z-grim.py', '4k', [], {}),
+    ('grim-each-3x4k', 'e-z-grim.py', '3x4k', ['--output', 'each'], {}),
+    ('grim-stream-4k', 'e-z-grim.py', '4k', ['-f', '--stream'], {}),
+    ('grim-webp-4k', 'e-z-grim.py', '4k', ['-f'], {'image_type': 'webp'}),
+    ('grim-jpeg-4k', 'e-z-grim.py', '4k', ['-f'], {'image_type': 'jpeg'}),
+    ('grim-caption-4k', 'e-z-grim.py', '4k', ['-f', '-t', 'BENCHMARK'], {}),
+    ('grim-budget-4k', 'e-z-grim.py', '4k', ['-f'], {'max_upload_size': '20K'}),
+    ('flameshot-full-1080p', 'e-z-flameshot.py', '1080p', ['-f'], {}),
+    ('flameshot-full-4k', 'e-z-flameshot.py', '4k', ['-f'], {}),
+]
+
+# Relative slack before a metric counts as a regression, and absolute amounts below which
+# differences are noise
+TOLERANCE = 0.25
+NOISE_FLOOR = {'wall_ms': 20, 'rss_kib': 4096, 'bytes': 1024}
+
+# Interpreter startup, the Pillow import and a PNG encode: what most scenarios spend their time on
+CALIBRATION = ("import io\nfrom PIL import Image\n"
+               "Image.radial_gradient('L').resize((1920, 1080)).convert('RGB').save(io.BytesIO(), 'PNG', compress_level=6)")
+CALIBRATION_RUNS = 5
+
+STARTUP_LINE = re.compile(r'^  (\S.*?)\s+[\d.]+\s+\(\+([\d.]+)\)$')
+STAGE_TIMINGS = re.compile(r'Stage timings: (.*)$')
+
+def find_font():
+    """Any TrueType font on the system, so caption scenarios never download one."""
+    for directory in ('/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.local/share/fonts')):
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                if name.lower().endswith('.ttf'):
+                    return os.path.join(root, name)
+    return None
+
+def make_home(overrides: dict, font) -> str:
+    home = tempfile.mkdtemp(prefix='e-zshot-bench-')
+    config_dir = os.path.join(home, '.config', 'e-zshot')
+    os.makedirs(config_dir)
+    os.makedirs(os.path.join(home, '.config', 'flameshot'))
+    open(os.path.join(home, '.config', 'flameshot', 'flameshot.ini'), 'w').close()
+    os.makedirs(os.path.join(home, 'run'), mode=0o700)
+
+    config = {'api_key': 'bench_0000000000', 'domain': 'https://i.e-z.host/', 'screenshot_tool': 'grim',
+              'image_type': 'png', 'compression_level': '6',
+              # Every run uploads the same frame; the upload cache would turn all but the first into hits
+              'dedup': 'false'}
+    config.update(overrides)
+    with open(os.path.join(config_dir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    if font:
+        shutil.copy(font, os.path.join(config_dir, 'impact.ttf'))
+    return home
+
+def run_once(plugin: str, layout: str, args: list, home: str, upload_server) -> dict:
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('XDG_CURRENT_DESKTOP', 'HYPRLAND_INSTANCE_SIGNATURE', 'DISPLAY')}
+    env.update({
+        'HOME': home,
+        'PATH': STUBS_DIR + os.pathsep + env.get('PATH', ''),
+        'XDG_RUNTIME_DIR': os.path.join(home, 'run'),
+        'WAYLAND_DISPLAY': 'bench',
+        'SWAYSOCK': 'bench',
+        'BENCH_OUTPUTS': LAYOUTS[layout],
+        'EZSHOT_UPLOAD_URL': upload_server.url,
+    })
+    command = [sys.executable, os.path.join(PLUGINS_DIR, plugin)] + args + ['-v', '--startup-report']
+
+    with upload_server.lock:
+        bytes_before = upload_server.stats['bytes']
+    with tempfile.TemporaryFile() as output:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(command, env=env, stdin=subprocess.DEVNULL, stdout=output, stderr=output)
+        # wait4 gives this child's own rusage, including the stub tools it ran
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start_time
+        process.returncode = os.waitstatus_to_exitcode(status)
+        output.seek(0)
+        log = output.read().decode(errors='replace')
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited with {process.returncode}:\n{log}")
+
+    stages = {}
+    for line in log.splitlines():
+        match = STARTUP_LINE.match(line)
+        if match and match.group(1) != 'main':
+            stages[match.group(1)] = float(match.group(2))
+        match = STAGE_TIMINGS.search(line)
+        if match:
+            for part in match.group(1).split(', '):
+                name, _, seconds = part.rpartition(' ')
+                stages[f"stage {name}"] = float(seconds.rstrip('s')) * 1000
+
+    with upload_server.lock:
+        uploaded = upload_server.stats['bytes'] - bytes_before
+    return {'wall_ms': wall * 1000, 'rss_kib': usage.ru_maxrss, 'bytes': uploaded, 'stages': stages}
+
+def run_scenario(scenario, repeat: int, upload_server, font) -> dict:
+    name, plugin, layout, args, overrides = scenario
+    home = make_home(overrides, font)
+    try:
+        # One untimed run fills the stubs' frame cache and the page cache
+        run_once(plugin, layout, args, home, upload_server)
+        runs = [run_once(plugin, layout, args, home, upload_server) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    stage_names = [stage for stage in runs[0]['stages']]
+    return {
+        # Other load on the machine only ever adds time, so the fastest run is the most repeatable
+        'wall_ms': min(run['wall_ms'] for run in runs),
+        'rss_kib': max(run['rss_kib'] for run in runs),
+        'bytes': runs[-1]['bytes'],
+        'stages': {stage: statistics.median(run['stages'].get(stage, 0) for run in runs) for stage in stage_names},
+    }
+
+def calibrate() -> float:
+    """Fastest time in milliseconds the calibration workload takes on this machine."""
+    times = []
+    for _ in range(CALIBRATION_RUNS):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', CALIBRATION], check=True)
+        times.append((time.perf_counter() - start_time) * 1000)
+    return min(times)
+
+def compare(name: str, result: dict, baselines: dict, speed: float = 1.0) -> list:
+    """Metrics that got worse than the baseline beyond tolerance and noise.
+
+    speed is this machine's calibration time over the baselines'; wall times are scaled by it.
+    """
+    baseline = baselines.get(name)
+    if not baseline:
+        return []
+    regressions = []
+    for metric, floor in NOISE_FLOOR.items():
+        before, after = baseline.get(metric), result[metric]
+        if before is not None and metric == 'wall_ms':
+            before *= speed
+        if before is not None and after > before * (1 + TOLERANCE) and after - before > floor:
+            regressions.append(f"{metric} {before:.0f} -> {after:.0f} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark capture-to-URL time of the e-zshot plugins.")
+    parser.add_argument('-k', '--filter', type=str, default='', help="Only run scenarios whose name contains this")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per scenario (default 3)")
+    parser.add_argument('--latency', type=float, default=0.02, help="Server latency in seconds (default 0.02)")
+    parser.add_argument('--bandwidth', type=str, default='0', help="Server bandwidth limit, e.g. 2M (default none)")
+    parser.add_argument('--save', action='store_true', help="Write the results to baselines.json")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        with open(BASELINES_FILE, 'r') as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        stored = {}
+    # Numbers taken against a differently throttled server aren't comparable
+    conditions = {'latency': args.latency, 'bandwidth': server.parse_rate(args.bandwidth)}
+    baselines = stored.get('scenarios', {}) if stored.get('conditions') == conditions else {}
+    if stored and not baselines and not args.save:
+        print(f"Baselines were recorded with {stored.get('conditions')}, not comparing.")
+
+    # Calibrated before and after the scenarios, so load that comes or goes during the run is averaged in
+    calibration_before = calibrate()
+    font = find_font()
+    upload_server = server.serve(latency=args.latency, bandwidth=server.parse_rate(args.bandwidth))
+    results = {}
+
+    for scenario in SCENARIOS:
+        name = scenario[0]
+        if args.filter not in name:
+            continue
+        if '-t' in scenario[3] and not font:
+            print(f"{name:<22} skipped: no TrueType font found for captions")
+            continue
+
+        result = run_scenario(scenario, args.repeat, upload_server, font)
+        results[name] = result
+        if not args.json:
+            stages = ', '.join(f"{stage} {ms:.0f}" for stage, ms in result['stages'].items())
+            print(f"{name:<22} {result['wall_ms']:7.0f} ms  {result['rss_kib'] / 1024:6.1f} MiB  "
+                  f"{result['bytes'] / 1024:8.0f} KiB up  [{stages}]")
+
+    upload_server.shutdown()
+    calibration_ms = (calibration_before + calibrate()) / 2
+    speed = calibration_ms / stored['calibration_ms'] if baselines and stored.get('calibration_ms') else 1.0
+    failed = False
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Calibration: {calibration_ms:.0f} ms" + (f", wall times compared at {speed:.2f}x the baselines'"
+                                                         if speed != 1.0 else ''))
+    for name, result in results.items():
+        regressions = compare(name, result, baselines, speed)
+        failed = failed or bool(regressions)
+        for regression in regressions if not args.json else []:
+            print(f"{name:<22} REGRESSION: {regression}")
+
+    if args.save:
+        # Kept baselines from a partial run are brought to this machine's speed along with the calibration
+        for baseline in baselines.values():
+            baseline['wall_ms'] = round(baseline['wall_ms'] * speed)
+        baselines.update({name: {metric: round(result[metric]) for metric in NOISE_FLOOR}
+                          for name, result in results.items()})
+        with open(BASELINES_FILE, 'w') as f:
+            json.dump({'conditions': conditions, 'calibration_ms': round(calibration_ms, 1), 'scenarios': baselines},
+                      f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baselines for {len(results)} scenarios to {BASELINES_FILE}")
+    elif failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Local stand-in for api.e-z.host/files with configurable latency and bandwidth.
+
+Accepts the plugins' multipart POSTs (fixed-length or chunked) and HEAD warm-ups, answers with an
+``imageUrl`` like the real API, and counts requests and bytes at ``GET /stats``. Run it on its own to
+point a plugin at it by hand:
+
+    python3 bench/server.py --port 8765 --latency 0.05 --bandwidth 2M
+    EZSHOT_UPLOAD_URL=http://127.0.0.1:8765/files plugins/e-z-grim.py -f
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+READ_SIZE = 64 * 1024
+
+def parse_rate(value) -> float:
+    """Bytes per second from e.g. 500K or 2M (0 for unlimited)."""
+    text = str(value or 0).strip().upper().rstrip('B')
+    multiplier = 1
+    if text and text[-1] in 'KMG':
+        multiplier = 1024 ** ('KMG'.index(text[-1]) + 1)
+        text = text[:-1]
+    return float(text) * multiplier
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict = None) -> None:
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def _read_body(self) -> int:
+        """Drain the request body at the configured bandwidth and return its size."""
+        bandwidth = self.server.bandwidth
+        received = 0
+        start_time = time.perf_counter()
+
+        def throttle(size):
+            nonlocal received
+            received += size
+            if bandwidth:
+                ahead = received / bandwidth - (time.perf_counter() - start_time)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                remaining = size
+                while remaining:
+                    chunk = self.rfile.read(min(READ_SIZE, remaining))
+                    remaining -= len(chunk)
+                    throttle(len(chunk))
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get('Content-Length') or 0)
+            while remaining:
+                chunk = self.rfile.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                throttle(len(chunk))
+        return received
+
+    def do_HEAD(self):
+        time.sleep(self.server.latency)
+        self._reply(200)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.server.lock:
+                self._reply(200, dict(self.server.stats))
+        else:
+            self._reply(404, {'success': False})
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        size = self._read_body()
+        with self.server.lock:
+            self.server.stats['requests'] += 1
+            self.server.stats['bytes'] += size
+        if not self.headers.get('key'):
+            self._reply(401, {'success': False, 'message': 'Missing API key'})
+            return
+        self._reply(200, {'success': True, 'imageUrl': f"https://i.e-z.host/{uuid.uuid4().hex[:8]}"})
+
+def serve(port: int = 0, latency: float = 0, bandwidth: float = 0) -> ThreadingHTTPServer:
+    """Start the server on a background thread; the upload URL is ``server.url``."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.lock = threading.Lock()
+    server.stats = {'requests': 0, 'bytes': 0}
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/files"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the e-z.host upload API.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help="Seconds added before every response")
+    parser.add_argument('--bandwidth', type=str, default='0', help="Upload bandwidth limit, e.g. 500K or 2M per second")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, parse_rate(args.bandwidth))
+    print(f"Listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Synthetic desktop frames for the stub capture tools.
+
+The layout comes from $BENCH_OUTPUTS, e.g. ``DP-1:3840x2160,DP-2:3840x2160``; outputs sit side by side.
+Frames look like a desktop (flat background, windows, lines of "text") so they compress like real
+screenshots, and every encoded result is cached in $BENCH_CACHE, which keeps the stubs' own cost out of
+the measurements after the first run.
+"""
+
+import hashlib
+import io
+import os
+import random
+
+DEFAULT_OUTPUTS = 'DP-1:1920x1080'
+
+def outputs() -> list:
+    result = []
+    x = 0
+    for spec in (os.environ.get('BENCH_OUTPUTS') or DEFAULT_OUTPUTS).split(','):
+        name, size = spec.split(':')
+        width, height = (int(value) for value in size.split('x'))
+        result.append({'name': name, 'x': x, 'y': 0, 'width': width, 'height': height})
+        x += width
+    return result
+
+def _cache_path(key: str) -> str:
+    directory = os.environ.get('BENCH_CACHE') or f"/tmp/e-zshot-bench-{os.getuid()}"
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+def _draw_output(draw, left: int, width: int, height: int, seed: int) -> None:
+    rng = random.Random(seed)
+    draw.rectangle([left, 0, left + width, height], fill=(38, 50, 56))
+    for _ in range(4):
+        w, h = rng.randint(width // 4, width // 2), rng.randint(height // 4, height // 2)
+        x, y = left + rng.randint(0, width - w), rng.randint(0, height - h)
+        draw.rectangle([x, y, x + w, y + h], fill=(250, 250, 250), outline=(90, 90, 90))
+        draw.rectangle([x, y, x + w, y + 28], fill=(60, 63, 65))
+        line_y = y + 40
+        while line_y < y + h - 16:
+            line_x = x + 12
+            while line_x < x + w - 40:
+                word = rng.randint(12, 60)
+                draw.rectangle([line_x, line_y, line_x + word, line_y + 9], fill=rng.choice(
+                    [(30, 30, 30), (30, 30, 30), (0, 90, 180), (160, 40, 40)]))
+                line_x += word + 8
+            line_y += 18
+
+def frame():
+    """The whole layout as one RGB image."""
+    from PIL import Image, ImageDraw
+
+    layout = outputs()
+    width = sum(output['width'] for output in layout)
+    height = max(output['height'] for output in layout)
+    path = _cache_path(f"frame {width}x{height} {layout}")
+    if os.path.exists(path):
+        return Image.open(path).convert('RGB')
+
+    image = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(image)
+    for index, output in enumerate(layout):
+        _draw_output(draw, output['x'], output['width'], output['height'], index)
+    image.save(path, format='PPM')
+    return image
+
+def encoded(box, image_format: str, **options) -> bytes:
+    """The frame cropped to box (or whole, if None) and encoded, cached across calls."""
+    key = f"{os.environ.get('BENCH_OUTPUTS')} {box} {image_format} {sorted(options.items())}"
+    path = _cache_path(key)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    image = frame()
+    if box:
+        image = image.crop(box)
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    data = output.getvalue()
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
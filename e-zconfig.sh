@@ -4,7 +4,8 @@ CONFIG_DIR="$HOME/.config/e-zshot"
 CONFIG_FILE="$CONFIG_DIR/config.json"
 DEFAULT_DOMAIN="https://i.e-z.host/"
 DEFAULT_IMAGE_TYPE="png"
-DEFAULT_COMPRESSION_LEVEL=0
+DEFAULT_COMPRESSION_LEVEL=6
+DEFAULT_JPEG_QUALITY=90
 DEFAULT_SCREENSHOT_TOOL="flameshot"
 
 # Function to prompt user for input with a default value
@@ -85,18 +86,27 @@ main() {
 
         local image_type
         image_type=$(echo "$config" | jq -r '.image_type // empty')
-        image_type=$(prompt_user "Enter image type (PNG, JPEG, GIF)" "$image_type")
+        image_type=$(prompt_user "Enter image type (PNG, PNG8, JPEG, WEBP, GIF)" "$image_type")
         [[ -z $image_type ]] && image_type=$DEFAULT_IMAGE_TYPE
+        image_type=${image_type,,}
 
         local compression_level
         compression_level=$(echo "$config" | jq -r '.compression_level // empty')
-        if [[ $image_type == "png" ]]; then
-            compression_level=$(prompt_int "Enter PNG compression level (0-9)" "$compression_level")
+        if [[ $image_type == "png" || $image_type == "png8" || $image_type == "webp" ]]; then
+            compression_level=$(prompt_int "Enter compression level (0-9)" "${compression_level:-$DEFAULT_COMPRESSION_LEVEL}")
             [[ $compression_level -lt 0 || $compression_level -gt 9 ]] && compression_level=$DEFAULT_COMPRESSION_LEVEL
         else
             compression_level=$DEFAULT_COMPRESSION_LEVEL
         fi
 
+        local jpeg_quality
+        jpeg_quality=$(echo "$config" | jq -r '.jpeg_quality // empty')
+        if [[ $image_type == "jpeg" || $image_type == "jpg" ]]; then
+            jpeg_quality=$(prompt_int "Enter JPEG quality (1-100)" "${jpeg_quality:-$DEFAULT_JPEG_QUALITY}")
+            [[ $jpeg_quality -lt 1 || $jpeg_quality -gt 100 ]] && jpeg_quality=$DEFAULT_JPEG_QUALITY
+        fi
+        [[ -z $jpeg_quality ]] && jpeg_quality=$DEFAULT_JPEG_QUALITY
+
         local save_to_disk
         save_to_disk=$(echo "$config" | jq -r '.save_to_disk // empty')
         save_to_disk=$(prompt_bool "Save screenshot to disk" "$save_to_disk")
@@ -115,7 +125,8 @@ main() {
         [[ -z $screenshot_tool ]] && screenshot_tool=$DEFAULT_SCREENSHOT_TOOL
     fi
 
-    local new_config=$(jq -n --arg api_key "$api_key" --arg domain "$domain" --arg image_type "$image_type" --arg compression_level "$compression_level" --arg save_to_disk "$save_to_disk" --arg upload_to_api "$upload_to_api" --arg verbose "$verbose" --arg screenshot_tool "$screenshot_tool" '{api_key: $api_key, domain: $domain, image_type: $image_type, compression_level: $compression_level, save_to_disk: $save_to_disk, upload_to_api: $upload_to_api, verbose: $verbose, screenshot_tool: $screenshot_tool}')
+    # Merge into the existing config so settings that are only edited by hand are kept
+    local new_config=$(echo "$config" | jq --arg api_key "$api_key" --arg domain "$domain" --arg image_type "$image_type" --arg compression_level "$compression_level" --arg jpeg_quality "$jpeg_quality" --arg save_to_disk "$save_to_disk" --arg upload_to_api "$upload_to_api" --arg verbose "$verbose" --arg screenshot_tool "$screenshot_tool" '. + {api_key: $api_key, domain: $domain, image_type: $image_type, compression_level: $compression_level, jpeg_quality: $jpeg_quality, save_to_disk: $save_to_disk, upload_to_api: $upload_to_api, verbose: $verbose, screenshot_tool: $screenshot_tool}')
 
     save_config "$new_config"
 
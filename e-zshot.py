@@ -2,11 +2,23 @@
 
 import json
 import os
+import signal
+import socket
 import subprocess
 import sys
+import threading
+import time
 
 # Adjust this path based on where the configuration file is installed
 CONFIG_FILE = os.path.expanduser('~/.config/e-zshot/config.json')
+# The socket lives in the per-user runtime directory only; without one there is no daemon
+RUNTIME_DIR = os.environ.get('XDG_RUNTIME_DIR')
+SOCKET_PATH = os.path.join(RUNTIME_DIR, f'e-zshot-{os.getuid()}.sock') if RUNTIME_DIR else None
+
+# Modes that run for a long time or hand work to a background worker. They run in the client's own
+# process, where Ctrl+C reaches them and their output appears as it is written, instead of holding
+# up the single-threaded daemon
+LOCAL_FLAGS = {'--interval', '--record', '--bulk', '--drain-queue', '-q', '--queue', '--queue-status'}
 
 def load_config() -> dict:
     """Load the configuration file."""
@@ -22,46 +34,341 @@ def load_config() -> dict:
 
     return config
 
+# Set by the SIGTERM handler, so the SystemExit it raises isn't mistaken for a plugin exiting
+_shutting_down = False
+
+PLUGINS = {
+    'flameshot': 'e-z-flameshot',
+    'grim': 'e-z-grim',
+    'gnome': 'e-z-gnome',
+}
+
+# Remembers where each plugin was found so the search paths are not probed on every run
+PLUGIN_CACHE_FILE = os.path.expanduser('~/.config/e-zshot/plugins.json')
+
+def load_plugin_cache() -> dict:
+    try:
+        with open(PLUGIN_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_plugin_cache(cache: dict) -> None:
+    try:
+        with open(PLUGIN_CACHE_FILE, 'w') as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
 def find_script(script_name: str) -> str:
     """Find the script with .py extension or fallback to without .py."""
+    cache = load_plugin_cache()
+    # Keyed by the dispatcher's own directory: a checkout and an installed copy each find their own plugins
+    cache_key = f"{os.path.dirname(os.path.abspath(__file__))}:{script_name}"
+    cached_path = cache.get(cache_key)
+    if cached_path and os.path.isfile(cached_path):
+        return cached_path
+
     possible_paths = [
         os.path.join(os.path.dirname(__file__), 'plugins', script_name + '.py'),
         os.path.join(os.path.dirname(__file__), 'plugins', script_name),
         os.path.join('/usr/bin', script_name + '.py'),
         os.path.join('/usr/bin', script_name)
     ]
-    
+
     for path in possible_paths:
         if os.path.isfile(path):
-            return path
+            cache[cache_key] = os.path.abspath(path)
+            save_plugin_cache(cache)
+            return cache[cache_key]
 
     return None
 
-def main():
+def resolve_script() -> str:
+    """Map the configured screenshot tool to the path of its plugin."""
     config = load_config()
     screenshot_tool = config.get('screenshot_tool', 'flameshot')
-    
-    script_name = ''
-    if screenshot_tool == 'flameshot':
-        script_name = 'e-z-flameshot'
-    elif screenshot_tool == 'grim':
-        script_name = 'e-z-grim'
-    elif screenshot_tool == 'gnome':
-        script_name = 'e-z-gnome'
-    else:
+
+    script_name = PLUGINS.get(screenshot_tool)
+    if not script_name:
         print(f"Unsupported screenshot tool: {screenshot_tool}")
         sys.exit(1)
 
     script_path = find_script(script_name)
-    
+
     if not script_path:
         print(f"Script {script_name} not found.")
         sys.exit(1)
 
+    return script_path
+
+def recv_message(sock: socket.socket) -> dict:
+    """Read one JSON message terminated by the peer closing its side."""
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b''.join(chunks) or b'{}')
+
+def send_to_daemon(message: dict):
+    """Send a request to a running daemon. Returns None if no daemon is listening."""
+    if not SOCKET_PATH or not os.path.exists(SOCKET_PATH):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET_PATH)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        sock.sendall(json.dumps(message).encode())
+        sock.shutdown(socket.SHUT_WR)
+        return recv_message(sock)
+
+def runs_locally(argv: list) -> bool:
+    return any(arg.split('=', 1)[0] in LOCAL_FLAGS for arg in argv)
+
+def forward_to_daemon(argv: list):
+    """Run a capture through the daemon. Returns the exit status, or None if no daemon is running."""
+    if runs_locally(argv):
+        return None
+    try:
+        response = send_to_daemon({'argv': argv, 'cwd': os.getcwd()})
+    except (OSError, ValueError) as e:
+        print(f"Lost connection to e-zshot daemon: {e}")
+        return 1
+    except KeyboardInterrupt:
+        # Closing the connection tells the daemon to interrupt the capture
+        return 130
+
+    if response is None:
+        return None
+
+    sys.stdout.write(response.get('stdout', ''))
+    sys.stderr.write(response.get('stderr', ''))
+    sys.stdout.flush()
+    return response.get('status', 1)
+
+def load_plugin(script_path: str):
+    """Import a .py plugin as a module, reusing it if it is already loaded."""
+    import importlib.util
+
+    module_name = os.path.basename(script_path)[:-3].replace('-', '_')
+    module = sys.modules.get(module_name)
+    if module is None or getattr(module, '__file__', None) != script_path:
+        spec = importlib.util.spec_from_file_location(module_name, script_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return module
+
+def run_plugin(script_path: str, argv: list) -> int:
+    """Call a .py plugin's main() in this process, or exec plugins installed without the suffix."""
     if script_path.endswith('.py'):
-        subprocess.run(['python3', script_path] + sys.argv[1:])
-    else:
-        subprocess.run([script_path] + sys.argv[1:])
+        load_plugin(script_path).main(argv)
+        return 0
+
+    return subprocess.run([script_path] + argv).returncode
+
+def run_plugin_captured(script_path: str, argv: list, cwd: str) -> dict:
+    """Run a plugin inside the daemon and collect its output for the client."""
+    import io
+    import logging
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    status = 0
+    # Handlers the plugins set up earlier still write to the daemon's own stderr; this one reaches the client
+    log_handler = logging.StreamHandler(stderr)
+    log_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.getLogger().addHandler(log_handler)
+
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            if script_path.endswith('.py'):
+                run_plugin(script_path, argv)
+            else:
+                result = subprocess.run([script_path] + argv, capture_output=True, text=True)
+                print(result.stdout, end='')
+                print(result.stderr, end='', file=sys.stderr)
+                status = result.returncode
+    except SystemExit as e:
+        if _shutting_down:
+            raise
+        if isinstance(e.code, int):
+            status = e.code
+        else:
+            status = 0 if e.code is None else 1
+            if e.code is not None:
+                print(e.code, file=stderr)
+    except Exception:
+        stderr.write(traceback.format_exc())
+        status = 1
+    finally:
+        logging.getLogger().removeHandler(log_handler)
+
+    return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+def watch_client(conn: socket.socket, client_gone: threading.Event):
+    """Interrupt the daemon's main thread if the client hangs up while its request is running.
+
+    Returns a function that stops watching; once it has returned, no interrupt is sent any more.
+    """
+    import select
+
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def watch():
+        poller = select.poll()
+        poller.register(conn, select.POLLHUP)
+        while not done.is_set():
+            # The client has already shut down its sending side, so only a full close raises POLLHUP
+            if any(events & select.POLLHUP for _, events in poller.poll(200)):
+                with lock:
+                    if not done.is_set():
+                        client_gone.set()
+                        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+
+    def stop():
+        with lock:
+            done.set()
+        watcher.join()
+
+    return stop
+
+def format_stats(stats: dict) -> str:
+    lines = [f"Captures served: {stats['captures']}"]
+    if stats['first'] is not None:
+        lines.append(f"First capture (cold): {stats['first']:.3f}s")
+    warm = stats['captures'] - 1
+    if warm > 0:
+        lines.append(f"Warm captures: {warm}, average {stats['warm_total'] / warm:.3f}s, "
+                     f"best {stats['warm_best']:.3f}s")
+    return '\n'.join(lines) + '\n'
+
+def settle_uploads() -> None:
+    """Check abandoned hedged uploads once the client already has its reply."""
+    hedge = sys.modules.get('ezshot.hedge')
+    if hedge is not None:
+        hedge.settle()
+
+def serve_daemon() -> None:
+    """Keep plugins, their imports and HTTP connections warm behind a UNIX socket."""
+    if not SOCKET_PATH:
+        print("XDG_RUNTIME_DIR is not set, so there is no private directory for the daemon's socket.")
+        sys.exit(1)
+    if send_to_daemon({'stats': True}) is not None:
+        print(f"An e-zshot daemon is already listening on {SOCKET_PATH}")
+        sys.exit(1)
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+
+    old_umask = os.umask(0o077)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    os.umask(old_umask)
+    server.listen(8)
+    print(f"e-zshot daemon listening on {SOCKET_PATH}", flush=True)
+
+    def on_sigterm(signum, frame):
+        global _shutting_down
+        _shutting_down = True
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    # Plugins leave abandoned hedged uploads for the daemon to check after the reply has gone out
+    os.environ['EZSHOT_DAEMON'] = '1'
+    stats = {'captures': 0, 'first': None, 'warm_total': 0.0, 'warm_best': None}
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    request = recv_message(conn)
+                except (OSError, ValueError):
+                    continue
+
+                if request.get('stats'):
+                    response = {'status': 0, 'stdout': format_stats(stats)}
+                else:
+                    start_time = time.perf_counter()
+                    try:
+                        script_path = resolve_script()
+                    except SystemExit:
+                        if _shutting_down:
+                            raise
+                        response = {'status': 1, 'stdout': "Unable to resolve the configured plugin.\n"}
+                    else:
+                        client_gone = threading.Event()
+                        stop_watching = watch_client(conn, client_gone)
+                        try:
+                            try:
+                                response = run_plugin_captured(script_path, request.get('argv', []),
+                                                               request.get('cwd') or os.path.expanduser('~'))
+                            finally:
+                                stop_watching()
+                        except KeyboardInterrupt:
+                            if not client_gone.is_set():
+                                raise
+                            print("Client went away, capture interrupted", flush=True)
+                            response = {'status': 130}
+                    elapsed = time.perf_counter() - start_time
+
+                    stats['captures'] += 1
+                    if stats['first'] is None:
+                        stats['first'] = elapsed
+                        kind = 'cold'
+                    else:
+                        stats['warm_total'] += elapsed
+                        stats['warm_best'] = min(stats['warm_best'] or elapsed, elapsed)
+                        kind = 'warm'
+                    print(f"Capture {stats['captures']} ({kind}) took {elapsed:.3f}s", flush=True)
+
+                try:
+                    conn.sendall(json.dumps(response).encode())
+                except OSError:
+                    pass
+            # After the connection is closed, which is what tells the client the reply is complete
+            settle_uploads()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+
+def main():
+    if sys.argv[1:2] == ['--daemon']:
+        serve_daemon()
+        return
+
+    if sys.argv[1:2] == ['--daemon-stats']:
+        response = send_to_daemon({'stats': True})
+        if response is None:
+            print("No e-zshot daemon is running.")
+            sys.exit(1)
+        print(response.get('stdout', ''), end='')
+        return
+
+    status = forward_to_daemon(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+    status = run_plugin(resolve_script(), sys.argv[1:])
+    if status:
+        sys.exit(status)
 
 if __name__ == "__main__":
     main()
@@ -7,15 +7,17 @@ import argparse
 import sys
 import io
 from typing import Optional, Dict
-from PIL import Image, ImageDraw, ImageFont
-import requests
 import logging
 import traceback
 import time
 import random
 import string
 
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from ezshot import animate, bandwidth, caption, dedup, encode, history, metrics, session, stages, startup
+
 CONFIG_FILE = os.path.expanduser('~/.config/e-zshot/config.json')
+UPLOAD_URL = os.environ.get('EZSHOT_UPLOAD_URL') or "https://api.e-z.host/files"
 DEFAULT_FONT_PATH = os.path.expanduser('~/.config/e-zshot/impact.ttf')  # Default font path
 
 # Configure logging
@@ -90,53 +92,62 @@ def enter_domain(domain, config):
 def generate_random_filename(length=6):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
-def save_to_disk(directory, file_name, data):
+def save_to_disk(directory, file_name, data, settings):
     try:
         if not file_name:
             file_name = generate_random_filename()  # Generate a random filename if none provided
-        file_path = os.path.join(directory, file_name + ".png")  # Save as PNG
-        with open(file_path, 'wb') as file:
-            file.write(data)
+        file_path = os.path.join(directory, file_name + "." + encode.extension(settings))
+        with metrics.span('save', bytes=len(data)):
+            with open(file_path, 'wb') as file:
+                file.write(data)
         logging.info(f"Screenshot saved to {file_path}")
+        return file_path
     except Exception as e:
         logging.error(f"Error saving screenshot: {e}")
         print(f"Error saving screenshot: {e}")
         exit(1)
 
-def add_text_to_image(image_data, top_text=None, bottom_text=None, text_color='white', font_path=DEFAULT_FONT_PATH):
+def add_text_to_image(image_data, top_text=None, bottom_text=None, text_color='white', font_path=DEFAULT_FONT_PATH,
+                      settings=None):
+    from PIL import Image
+
     try:
+        settings = settings or encode.settings_from_config({})
         with Image.open(io.BytesIO(image_data)) as img:
-            draw = ImageDraw.Draw(img)
-            font = ImageFont.truetype(font_path, 40)
-
-            def draw_text_with_frame(text, position, is_bottom):
-                text_bbox = draw.textbbox((0, 0), text, font=font)
-                text_width = text_bbox[2] - text_bbox[0]
-                text_height = text_bbox[3] - text_bbox[1]
-
-                text_x = (img.width - text_width) // 2
-                text_y = position[1]
-
-                draw.text((text_x, text_y - (text_height // 2)), text, font=font, fill=text_color)
-
-            if top_text:
-                draw_text_with_frame(top_text, (0, 10), is_bottom=False)
-
-            if bottom_text:
-                text_bbox = draw.textbbox((0, 0), bottom_text, font=font)
-                text_height = text_bbox[3] - text_bbox[1]
-                bottom_position = (img.height - text_height - 10)
-                draw_text_with_frame(bottom_text, (0, bottom_position), is_bottom=True)
-
-            output = io.BytesIO()
-            img.save(output, format='PNG')
-            return output.getvalue()
+            with metrics.span('decode', bytes=len(image_data)):
+                img.load()
+            with metrics.span('overlay'):
+                img = caption.draw_captions(img, top_text, bottom_text, text_color, font_path, font_size=40,
+                                            outline=False)
+            with metrics.span('encode', format=settings['format']) as encode_span:
+                data = encode.encode_image(img, settings)
+                encode_span['bytes'] = len(data)
+            return data
 
     except Exception as e:
         logging.error(f"Error adding text to image: {e}")
         print(f"Error adding text to image: {e}")
         exit(1)
 
+def record_animation(args, settings):
+    """Record the full screen for args.record seconds; returns the animation and its encoder settings."""
+    def capture_frame():
+        return encode.decode(subprocess.run(['flameshot', 'full', '-r'], check=True, stdout=subprocess.PIPE).stdout)
+
+    with metrics.span('record', fps=args.fps) as record_span:
+        frames = animate.record(capture_frame, args.record, args.fps)
+        record_span['frames'] = len(frames)
+    if args.top_text or args.bottom_text:
+        with metrics.span('overlay', frames=len(frames)):
+            frames = [(caption.draw_captions(image, args.top_text, args.bottom_text, args.color, args.font_path,
+                                             font_size=40, outline=False), duration) for image, duration in frames]
+    settings = animate.animation_settings(settings)
+    with metrics.span('encode', format=settings['format']) as encode_span:
+        data = animate.encode_animation(frames, settings)
+        encode_span['bytes'] = len(data)
+    logging.info(f"Recorded {len(frames)} distinct frames: {len(data) / 1024:.0f} KiB {settings['format']}")
+    return data, settings
+
 def get_clipboard_tool():
     # Check if Wayland is in use
     if 'WAYLAND_DISPLAY' in os.environ:
@@ -145,16 +156,28 @@ def get_clipboard_tool():
         return 'xclip'  # X11 clipboard tool
 
 def take_screenshot_and_upload(api_key, config, args):
+    if not args.no_upload:
+        # Do the DNS/TCP/TLS setup while the user is busy in flameshot's selector
+        session.prewarm(UPLOAD_URL)
+
     try:
-        if args.fullscreen:
-            subprocess.run(['flameshot', 'full', '-p', '/tmp/screenshot.png'], check=True, stdout=subprocess.DEVNULL)
+        settings = encode.settings_from_config(config)
+        if args.record:
+            # A recording always covers the full screen: the selector can't be shown for every frame
+            screenshot_data, settings = record_animation(args, settings)
         else:
-            subprocess.run(['flameshot', 'gui', '-r', '-p', '/tmp/screenshot.png'], check=True, stdout=subprocess.DEVNULL)
-
-        # Process the screenshot with text and frame
-        temp_file = "/tmp/screenshot.png"
-        with open(temp_file, 'rb') as f:
-            screenshot_data = f.read()
+            # flameshot writes the PNG to stdout with -r, so the capture never goes through a file
+            mode = 'full' if args.fullscreen else 'gui'
+            # In gui mode flameshot runs its own selector, so this span includes the selection
+            with metrics.span('capture', tool='flameshot', mode=mode) as capture_span:
+                screenshot_data = subprocess.run(['flameshot', mode, '-r'], check=True,
+                                                 stdout=subprocess.PIPE).stdout
+                capture_span['bytes'] = len(screenshot_data)
+        startup.mark('capture done')
+        if not screenshot_data:
+            logging.info("Screenshot aborted.")
+            print("Screenshot aborted.")
+            exit(1)
 
         # Handle GUI text input
         # if args.gui:
@@ -165,20 +188,69 @@ def take_screenshot_and_upload(api_key, config, args):
           #  bottom_text = dialog.bottom_text
            # app.quit()
 
-            top_text = args.top_text
-            bottom_text = args.bottom_text
+        top_text = args.top_text
+        bottom_text = args.bottom_text
+
+        # Add text and frame to the screenshot. Without captions the PNG from flameshot is only
+        # decoded if the configured format differs, and passed through untouched otherwise.
+        # Recordings come back encoded, with their captions already drawn
+        if not args.record:
+            if top_text or bottom_text:
+                screenshot_data = add_text_to_image(screenshot_data, top_text, bottom_text, args.color,
+                                                    args.font_path, settings)
+            else:
+                with metrics.span('encode', format=settings['format']) as encode_span:
+                    screenshot_data = encode.ensure_format(screenshot_data, settings)
+                    encode_span['bytes'] = len(screenshot_data)
+
+        if args.no_upload:
+            logging.info("Upload skipped due to '-n' option.")
+            send_notification("Screenshot Not Uploaded", "The screenshot was not uploaded due to the '-n' option.")
+            return
 
-        # Add text and frame to the screenshot
-        screenshot_data = add_text_to_image(screenshot_data, top_text, bottom_text, args.color, args.font_path)
+        # Check the directory up front: the save now runs alongside the upload instead of after it
+        if args.save_to_disk and not (os.path.isdir(args.save_to_disk) and os.access(args.save_to_disk, os.W_OK)):
+            logging.error("Invalid directory or permission denied.")
+            print("Invalid directory or permission denied.")
+            exit(1)
 
-        if not args.no_upload:
+        pipeline = stages.Pipeline()
+        if args.save_to_disk:
+            # Saved under a temporary name and renamed to the upload's ID once the URL is known
+            pipeline.add('save', lambda: save_to_disk(args.save_to_disk, None, screenshot_data, settings))
+
+        def upload():
             # Upload the screenshot using API
-            url = "https://api.e-z.host/files"
-            files = {"file": ("screenshot.png", screenshot_data, "image/png")}
+            # Fitting an animation to the budget would flatten it to a single frame
+            budget = 0 if args.record else bandwidth.effective_budget(
+                encode.parse_size(config.get('max_upload_size')), config)
+            upload_data, upload_settings = encode.fit_bytes_to_budget(screenshot_data, settings, budget)
+            cache = dedup.settings_from_config(config)
+            hashes = None
+            if cache['enabled']:
+                image_url, hashes = dedup.lookup(upload_data, cache['perceptual'], cache['max_age_days'],
+                                                 force=args.force_upload)
+                if image_url:
+                    logging.info("Identical screenshot already uploaded, reusing its URL.")
+                    return image_url.split('/')[-1]
+
+            files = {"file": (encode.filename(upload_settings), upload_data, encode.mime_type(upload_settings))}
             headers = {"key": api_key}
 
-            response = requests.post(url, headers=headers, files=files)
-            response.raise_for_status()
+            import requests
+            try:
+                with metrics.span('upload', bytes=len(upload_data)):
+                    session.wait_until_warm()
+                    post_start = time.perf_counter()
+                    response = session.get_session().post(UPLOAD_URL, headers=headers, files=files,
+                                                          timeout=bandwidth.timeout(len(upload_data)))
+                    response.raise_for_status()
+                    bandwidth.record(len(upload_data), time.perf_counter() - post_start)
+            except requests.RequestException as e:
+                logging.error(f"Error uploading screenshot: {e}")
+                print(f"Error uploading screenshot: {e}")
+                exit(1)
+            startup.mark('upload done')
             response_json = response.json()
             image_url = response_json.get('imageUrl')
 
@@ -187,55 +259,62 @@ def take_screenshot_and_upload(api_key, config, args):
                 print("Error: Image URL is empty or null.")
                 exit(1)
 
+            if hashes:
+                dedup.store(hashes, image_url, len(upload_data), cache['max_entries'], cache['max_age_days'])
+
             # Extract unique ID from the URL
-            unique_id = image_url.split('/')[-1]
+            return image_url.split('/')[-1]
 
+        def copy_url(unique_id):
             # Determine clipboard tool based on environment
             clipboard_tool = get_clipboard_tool()
 
             # Copy URL to clipboard using appropriate tool
             final_url = config['domain'] + unique_id
-            if clipboard_tool == 'wl-copy':
-                subprocess.run([clipboard_tool], input=final_url.encode(), check=True)
-            elif clipboard_tool == 'xclip':
-                subprocess.run([clipboard_tool, '-sel', 'c'], input=final_url.encode(), check=True)
-
-            # Save to disk if directory is specified
-            if args.save_to_disk:
-                if os.path.isdir(args.save_to_disk) and os.access(args.save_to_disk, os.W_OK):
-                    save_to_disk(args.save_to_disk, unique_id, screenshot_data)
-                else:
-                    logging.error("Invalid directory or permission denied.")
-                    print("Invalid directory or permission denied.")
-                    exit(1)
+            with metrics.span('clipboard'):
+                if clipboard_tool == 'wl-copy':
+                    subprocess.run([clipboard_tool], input=final_url.encode(), check=True)
+                elif clipboard_tool == 'xclip':
+                    subprocess.run([clipboard_tool, '-sel', 'c'], input=final_url.encode(), check=True)
 
             logging.info(f"Screenshot URL: {final_url}")
             send_notification("Screenshot Uploaded", f"URL: {final_url}")
-        else:
-            logging.info("Upload skipped due to '-n' option.")
-            send_notification("Screenshot Not Uploaded", "The screenshot was not uploaded due to the '-n' option.")
+
+        def rename_saved(saved_path, unique_id):
+            final_path = os.path.join(args.save_to_disk, unique_id + "." + encode.extension(settings))
+            os.replace(saved_path, final_path)
+            logging.info(f"Screenshot renamed to {final_path}")
+            return final_path
+
+        def remember(unique_id, final_path=None):
+            history.record('e-z-flameshot', screenshot_data, path=final_path, url=config['domain'] + unique_id,
+                           image_format=settings['format'], settings=history.settings_from_config(config))
+
+        pipeline.add('upload', upload)
+        pipeline.add('clipboard', copy_url, after=['upload'])
+        if args.save_to_disk:
+            pipeline.add('rename', rename_saved, after=['save', 'upload'])
+        if history.enabled(config):
+            # The clipboard stage notifies with the URL itself, so the URL doesn't wait for this stage;
+            # only the exit does
+            pipeline.add('history', remember, after=['upload', 'rename'] if args.save_to_disk else ['upload'])
+        pipeline.wait()
 
     except subprocess.CalledProcessError as e:
         logging.error(f"Error taking/uploading screenshot: {e}")
         print(f"Error taking/uploading screenshot: {e}")
         exit(1)
-    except requests.RequestException as e:
-        logging.error(f"Error uploading screenshot: {e}")
-        print(f"Error uploading screenshot: {e}")
-        exit(1)
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         print(f"Unexpected error: {e}")
         exit(1)
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
 
 def send_notification(title, message):
-    subprocess.run(['notify-send', title, message])
+    # Fire and forget: nothing waits on the notification daemon
+    with metrics.span('notify'):
+        subprocess.Popen(['notify-send', title, message], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-def main():
+def main(argv=None):
     config_path = get_config_path()
     ensure_config_file_exists(config_path)
     config = load_config()
@@ -251,8 +330,39 @@ def main():
     parser.add_argument('-b', '--bottom-text', type=str, help="Text to display at the bottom of the screenshot")
     parser.add_argument('-c', '--color', type=str, default='white', help="Text color")
     parser.add_argument('-fpath', '--font-path', type=str, default=DEFAULT_FONT_PATH, help="Path to the font file")
-
-    args = parser.parse_args()
+    parser.add_argument('--record', type=float, metavar='SECONDS',
+                        help="Record the full screen as an animated WebP (or GIF, if that is the image_type)")
+    parser.add_argument('--fps', type=float, default=animate.DEFAULT_FPS, help="Frames per second for --record")
+    parser.add_argument('--force-upload', action='store_true',
+                        help="Upload even if an identical screenshot was uploaded before")
+    parser.add_argument('--cache-stats', action='store_true', help="Show upload cache hit rates and exit")
+    parser.add_argument('--history', nargs='?', const='', metavar='TEXT',
+                        help="List past screenshots, newest first: all, those whose URL or path contains TEXT, "
+                             "or the uploads of the file TEXT")
+    parser.add_argument('--limit', type=int, default=history.DEFAULT_LIMIT,
+                        help=f"Entries shown by --history (default {history.DEFAULT_LIMIT})")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile with cProfile and tracemalloc; both are saved under ~/.config/e-zshot/profiles")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Print how long each startup stage took before and after the capture")
+
+    args = parser.parse_args(argv)
+    if args.record is not None and args.record <= 0:
+        parser.error("--record must be a positive number of seconds")
+    if args.fps <= 0:
+        parser.error("--fps must be positive")
+    if args.record and animate.frame_limit_error(args.record, args.fps, config):
+        parser.error(animate.frame_limit_error(args.record, args.fps, config))
+    metrics.configure(config)
+    startup.begin()
+
+    if args.history is not None:
+        print(history.format_entries(history.query(args.history, args.limit)))
+        return
+
+    if args.cache_stats:
+        print(dedup.format_stats())
+        return
 
     if args.api_key:
         enter_api_key(args.api_key, config)
@@ -270,7 +380,13 @@ def main():
     # Set the domain URL
     config['domain'] = config.get('domain', "https://i.e-z.host/")  # Default to "https://i.e-z.host/" if domain is not set
 
-    take_screenshot_and_upload(api_key, config, args)
+    startup.mark('config loaded')
+    with metrics.recording('e-z-flameshot', profile=args.profile):
+        take_screenshot_and_upload(api_key, config, args)
+
+    if args.startup_report:
+        startup.mark('done')
+        startup.report()
 
 if __name__ == "__main__":
     main()
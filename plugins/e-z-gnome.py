@@ -5,17 +5,22 @@ import json
 import os
 import sys
 import logging
+import random
 import time
 
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from ezshot import bandwidth, capture, encode, metrics
+
 CONFIG_FILE = os.path.expanduser('~/.config/e-zshot/config.json')
-UPLOAD_URL = "https://api.e-z.host/files"
+UPLOAD_URL = os.environ.get('EZSHOT_UPLOAD_URL') or "https://api.e-z.host/files"
 
 def configure_logging(verbose: bool) -> None:
     level = logging.DEBUG if verbose else logging.WARNING
-    logging.basicConfig(level=level, format='%(message)s')
+    logging.basicConfig(level=level, format='%(message)s', force=True)
 
 def notify(message: str) -> None:
-    subprocess.run(['notify-send', "E-ZShot", message])
+    with metrics.span('notify'):
+        subprocess.run(['notify-send', "E-ZShot", message])
 
 def load_config() -> dict:
     if not os.path.exists(CONFIG_FILE):
@@ -31,85 +36,107 @@ def load_config() -> dict:
 
     return config
 
-def take_screenshot(fullscreen: bool, filename: str) -> None:
-    command = ['gnome-screenshot']
-    
-    if fullscreen:
-        command.extend(['--file', filename])
-    else:
-        command.extend(['--file', filename, '--area'])
-    
+def take_screenshot(fullscreen: bool, filename: str = None) -> bytes:
+    area = [] if fullscreen else ['--area']
+
     try:
-        subprocess.run(command, check=True)
-        print(f"Screenshot saved as {filename}")
+        # Captured into memory; the file is only written when one was asked for
+        with metrics.span('capture', tool='gnome-screenshot') as capture_span:
+            data = capture.capture_to_memory(lambda path: ['gnome-screenshot', '--file', path] + area,
+                                             interactive=bool(area))
+            capture_span['bytes'] = len(data)
+        if not data:
+            logging.info("Screenshot cancelled")
+            notify("Screenshot cancelled")
+            sys.exit(1)
+        if filename:
+            with metrics.span('save', bytes=len(data)):
+                with open(filename, 'wb') as f:
+                    f.write(data)
+            print(f"Screenshot saved as {filename}")
+        return data
     except subprocess.CalledProcessError as e:
         logging.error(f"Error taking screenshot: {e}")
         notify(f"Error taking screenshot: {e}")
         sys.exit(1)
 
-def upload_screenshot(filepath: str, api_key: str, domain: str) -> str:
+def upload_screenshot(data: bytes, api_key: str, domain: str, settings: dict, budget: int = 0) -> str:
     if not api_key or not domain:
         notify("Configuration incomplete. Please set it up.")
         sys.exit(1)
 
     max_retries = 3
-    base_timeout = 5
 
-    with open(filepath, 'rb') as f:
-        file_data = f.read()
+    with metrics.span('encode', format=settings['format']) as encode_span:
+        file_data = encode.ensure_format(data, settings)
+        file_data, settings = encode.fit_bytes_to_budget(file_data, settings, budget)
+        encode_span['bytes'] = len(file_data)
 
     logging.debug("Uploading screenshot...")
     print("Uploading", end="", flush=True)
 
-    for attempt in range(max_retries):
-        try:
-            headers = {"key": api_key}
-            files = {'file': ('screenshot.png', file_data, 'image/png')}
-            
-            response = requests.post(UPLOAD_URL, headers=headers, files=files, timeout=base_timeout * (attempt + 1))
-            response.raise_for_status()
-
-            print("\rUpload complete!", flush=True)
-            logging.debug("Upload successful.")
-            response_json = response.json()
-            return response_json.get('imageUrl')
-
-        except requests.RequestException as e:
-            logging.error(f"Upload attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                print(".", end="", flush=True)
-                time.sleep(2 ** attempt + random.uniform(0, 1))
-            else:
-                print("\nUpload failed.")
-                notify(f"Upload failed: {e}")
-                sys.exit(1)
+    with metrics.span('upload', bytes=len(file_data)) as upload_span:
+        for attempt in range(max_retries):
+            upload_span['attempts'] = attempt + 1
+            try:
+                headers = {"key": api_key}
+                files = {'file': (encode.filename(settings), file_data, encode.mime_type(settings))}
+
+                post_start = time.perf_counter()
+                response = requests.post(UPLOAD_URL, headers=headers, files=files,
+                                         timeout=bandwidth.timeout(len(file_data), attempt))
+                response.raise_for_status()
+                bandwidth.record(len(file_data), time.perf_counter() - post_start)
+
+                print("\rUpload complete!", flush=True)
+                logging.debug("Upload successful.")
+                response_json = response.json()
+                return response_json.get('imageUrl')
+
+            except requests.RequestException as e:
+                logging.error(f"Upload attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries - 1:
+                    print(".", end="", flush=True)
+                    time.sleep(2 ** attempt + random.uniform(0, 1))
+                else:
+                    print("\nUpload failed.")
+                    notify(f"Upload failed: {e}")
+                    sys.exit(1)
 
 def copy_to_clipboard(text: str) -> None:
     try:
-        subprocess.run(['xclip', '-selection', 'clipboard'], input=text.encode(), check=True)
+        with metrics.span('clipboard'):
+            subprocess.run(['xclip', '-selection', 'clipboard'], input=text.encode(), check=True)
         logging.debug("URL copied to clipboard.")
     except subprocess.CalledProcessError as e:
         logging.error(f"Error copying to clipboard: {e}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Take a screenshot and upload it to an API.")
     parser.add_argument('-v', '--verbose', action='store_true', help="Enable verbose logging")
     parser.add_argument('--fullscreen', action='store_true', help="Capture the entire screen")
-    parser.add_argument('--filename', type=str, default='/tmp/screenshot.png', help="Filename to save the screenshot")
+    parser.add_argument('--filename', type=str, help="Also save the screenshot to this file")
     parser.add_argument('--no-upload', action='store_true', help="Disable uploading the screenshot to API")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile with cProfile and tracemalloc; both are saved under ~/.config/e-zshot/profiles")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     configure_logging(args.verbose)
+    with metrics.recording('e-z-gnome', profile=args.profile):
+        take_and_upload(args)
 
+def take_and_upload(args) -> None:
     config = load_config()
+    metrics.configure(config)
     api_key = config['api_key']
     domain = config['domain']
 
-    take_screenshot(args.fullscreen, args.filename)
+    screenshot_data = take_screenshot(args.fullscreen, args.filename)
 
     if not args.no_upload:
+        budget = bandwidth.effective_budget(encode.parse_size(config.get('max_upload_size')), config)
         start_time = time.time()
-        image_url = upload_screenshot(args.filename, api_key, domain)
+        image_url = upload_screenshot(screenshot_data, api_key, domain, encode.settings_from_config(config), budget)
         elapsed_time = time.time() - start_time
 
         if not image_url:
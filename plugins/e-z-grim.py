@@ -1,7 +1,6 @@
 #!/usr/bin/python3
 
 import subprocess
-import requests
 import argparse
 import logging
 import random
@@ -11,19 +10,24 @@ import json
 import time
 import sys
 import os
-import io
+from concurrent.futures import ThreadPoolExecutor
 
-from PIL import Image, ImageDraw, ImageFont
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from ezshot import (animate, bandwidth, bulk, capture, caption, dedup, encode, hedge, history, metrics, outputs,
+                    redact, regions, session, spool, stages, startup, stream, timelapse)
 
 CONFIG_FILE = os.path.expanduser('~/.config/e-zshot/config.json')
-UPLOAD_URL = "https://api.e-z.host/files"
+# EZSHOT_UPLOAD_URL points uploads at a local stand-in, e.g. the benchmark server in bench/
+UPLOAD_URL = os.environ.get('EZSHOT_UPLOAD_URL') or "https://api.e-z.host/files"
 
 def configure_logging(verbose: bool) -> None:
     level = logging.DEBUG if verbose else logging.WARNING
-    logging.basicConfig(level=level, format='%(message)s')
+    logging.basicConfig(level=level, format='%(message)s', force=True)
 
 def notify(message: str) -> None:
-    subprocess.run(['notify-send', "E-ZShot", message])
+    # Fire and forget: nothing waits on the notification daemon
+    with metrics.span('notify'):
+        subprocess.Popen(['notify-send', "E-ZShot", message], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 def load_config() -> dict:
     if not os.path.exists(CONFIG_FILE):
@@ -39,6 +43,56 @@ def load_config() -> dict:
 
     return config
 
+def save_region(name: str, geometry: str) -> None:
+    """Store a geometry as a named preset in the config file."""
+    with open(CONFIG_FILE, 'r') as f:
+        config = json.load(f)
+    config.setdefault('regions', {})[name] = geometry
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=4)
+    print(f"Region '{name}' saved as {geometry}")
+
+def resolve_region(choice: str, config: dict) -> str:
+    """Geometry for --region: 'last', 'window' or the name of a preset in the config."""
+    if choice == 'last':
+        geometry, problem = regions.last(), "No region has been captured in this session yet."
+    elif choice == 'window':
+        geometry, problem = regions.focused_window(), "Could not find the focused window."
+    else:
+        geometry, problem = (config.get('regions') or {}).get(choice), f"No region named '{choice}' in the config."
+
+    if not geometry:
+        logging.error(problem)
+        notify(problem)
+        sys.exit(1)
+    logging.debug(f"Using region {geometry}")
+    return geometry
+
+def resolve_redactions(args, config: dict):
+    """(boxes, settings) from --redact and --redact-preset, or None if nothing is to be redacted."""
+    boxes = list(args.redact or [])
+    presets = config.get('redact_presets') or {}
+    for name in args.redact_preset or []:
+        if name not in presets:
+            logging.error(f"No redaction preset named '{name}' in the config.")
+            notify(f"No redaction preset named '{name}' in the config.")
+            sys.exit(1)
+        try:
+            boxes.extend(redact.box(text) for text in presets[name])
+        except ValueError as e:
+            logging.error(f"Invalid redaction preset '{name}': {e}")
+            notify(f"Invalid redaction preset '{name}': {e}")
+            sys.exit(1)
+    if not boxes:
+        return None
+
+    try:
+        return boxes, redact.settings_from_config(config, args.redact_mode)
+    except ValueError as e:
+        logging.error(str(e))
+        notify(str(e))
+        sys.exit(1)
+
 def detect_environment() -> str:
     wayland_env_vars = ['WAYLAND_DISPLAY', 'XDG_SESSION_TYPE']
     x11_env_vars = ['DISPLAY']
@@ -58,34 +112,53 @@ def detect_environment() -> str:
     
     return 'x11'
 
-def take_screenshot(full_screen: bool) -> bytes:
+def select_area(env: str) -> str:
+    """Let the user drag out a region with slurp (or slop on X11) and return its geometry."""
+    selector = 'slurp' if env == 'wayland' else 'slop'
+    logging.debug("Select area for screenshot...")
+    with metrics.span('selection', tool=selector):
+        slop_result = subprocess.run([selector], capture_output=True, text=True, check=True)
+    geometry = slop_result.stdout.strip()
+    if not geometry:
+        raise ValueError("No area selected")
+    return geometry
+
+def take_screenshot(full_screen: bool, grim_format: list, streaming: bool = False, output: str = None,
+                    geometry: str = None):
     try:
         env = detect_environment()
         if env == 'gnome':
-            command = ['gnome-screenshot']
-            if full_screen:
-                command.extend(['--file', '/tmp/screenshot.png'])
-            else:
-                command.extend(['--area', '--file', '/tmp/screenshot.png'])
+            if output:
+                logging.warning("gnome-screenshot can't capture a single output; capturing the whole screen.")
+            if geometry:
+                logging.warning("gnome-screenshot can't capture a given region; select it instead.")
+            area = [] if full_screen else ['--area']
             logging.debug("Taking screenshot with gnome-screenshot...")
-            subprocess.run(command, check=True)
-            with open('/tmp/screenshot.png', 'rb') as f:
-                result = f.read()
-            os.remove('/tmp/screenshot.png')
+            # gnome-screenshot runs its own selector, so for region shots this span includes the selection
+            with metrics.span('capture', tool='gnome-screenshot') as capture_span:
+                result = capture.capture_to_memory(lambda path: ['gnome-screenshot'] + area + ['--file', path],
+                                                   interactive=bool(area))
+                capture_span['bytes'] = len(result)
+            if not result:
+                raise ValueError("Screenshot cancelled")
         else:
-            if full_screen:
-                command = ['grim', '-t', 'png', '-l', '0', '-']
+            if output:
+                command = ['grim', '-o', output] + grim_format + ['-']
+                logging.debug(f"Taking screenshot of output {output}...")
+            elif full_screen and not geometry:
+                command = ['grim'] + grim_format + ['-']
                 logging.debug("Taking full-screen screenshot...")
             else:
-                selector = 'slurp' if env == 'wayland' else 'slop'
-                logging.debug("Select area for screenshot...")
-                slop_result = subprocess.run([selector], capture_output=True, text=True, check=True)
-                geometry = slop_result.stdout.strip()
                 if not geometry:
-                    raise ValueError("No area selected")
-                command = ['grim', '-g', geometry, '-t', 'png', '-l', '0', '-']
-            
-            result = subprocess.run(command, capture_output=True, check=True).stdout
+                    geometry = select_area(env)
+                regions.remember(geometry)
+                command = ['grim', '-g', geometry] + grim_format + ['-']
+
+            if streaming:
+                return start_streamed_capture(command, raw_capture_size(output, geometry))
+            with metrics.span('capture', tool='grim') as capture_span:
+                result = subprocess.run(command, capture_output=True, check=True).stdout
+                capture_span['bytes'] = len(result)
         
         logging.debug("Screenshot captured successfully.")
         return result
@@ -98,41 +171,291 @@ def take_screenshot(full_screen: bool) -> bytes:
         notify(f"Error: {e}")
         sys.exit(1)
 
-def upload_screenshot(data: bytes, api_key: str, domain: str) -> str:
+# Overlays that keep showing a still of the screen while slurp runs
+FREEZE_OVERLAYS = (['wayfreeze'], ['hyprpicker', '-r', '-z'])
+FREEZE_SETTLE = 0.1
+
+def start_freeze_overlay():
+    for command in FREEZE_OVERLAYS:
+        if shutil.which(command[0]):
+            overlay = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # Give the overlay a moment to map its surfaces before slurp grabs the pointer
+            time.sleep(FREEZE_SETTLE)
+            return overlay
+    logging.debug("No freeze overlay (wayfreeze or hyprpicker) found; selecting on the live screen.")
+    return None
+
+def parse_geometry(geometry: str) -> tuple:
+    """Turn slurp's 'X,Y WxH' into integers."""
+    position, size = geometry.split(' ')
+    x, y = (int(value) for value in position.split(','))
+    width, height = (int(value) for value in size.split('x'))
+    return x, y, width, height
+
+def take_frozen_screenshot():
+    """Grab every output once, let the user select on that frozen frame, and crop the selection in memory."""
+    try:
+        logging.debug("Capturing the frame to select from...")
+        with metrics.span('capture', tool='grim', frozen=True) as capture_span:
+            frame = subprocess.run(['grim', '-t', 'ppm', '-'], capture_output=True, check=True).stdout
+            capture_span['bytes'] = len(frame)
+        with metrics.span('selection', tool='slurp', frozen=True):
+            overlay = start_freeze_overlay()
+            try:
+                logging.debug("Select area for screenshot...")
+                geometry = subprocess.run(['slurp'], capture_output=True, text=True, check=True).stdout.strip()
+            finally:
+                if overlay is not None:
+                    overlay.terminate()
+                    overlay.wait()
+        if not geometry:
+            raise ValueError("No area selected")
+        regions.remember(geometry)
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error taking screenshot: {e.stderr.strip()}")
+        notify(f"Error taking screenshot: {e.stderr.strip()}")
+        sys.exit(1)
+    except ValueError as e:
+        logging.error(f"Error: {e}")
+        notify(f"Error: {e}")
+        sys.exit(1)
+
+    with metrics.span('decode', bytes=len(frame)):
+        image = encode.decode(frame)
+    x, y, width, height = parse_geometry(geometry)
+    # grim renders the whole layout from its top-left corner at the highest output scale;
+    # the ratio of frame to layout width gives that scale without assuming it
+    bounds = outputs.layout_bounds()
+    left, top = bounds[:2] if bounds else (0, 0)
+    scale = image.width / (bounds[2] - bounds[0]) if bounds else 1
+    box = (round((x - left) * scale), round((y - top) * scale),
+           round((x - left + width) * scale), round((y - top + height) * scale))
+    logging.debug(f"Cropping {box} from the {image.width}x{image.height} frame")
+    return image.crop(box)
+
+# Assumed for a streamed capture when the compositor can't report the screen size
+STREAM_SIZE_FALLBACK = 7680 * 4320 * 4
+
+def raw_capture_size(output: str = None, geometry: str = None) -> int:
+    """Width x height x 4 of a capture in physical pixels: an upper bound on what grim will send."""
+    output_list = outputs.list_outputs()
+    if not output_list:
+        return STREAM_SIZE_FALLBACK
+    scale = max(item['scale'] for item in output_list)
+    if geometry:
+        try:
+            width, height = (int(value) for value in geometry.split()[-1].split('x'))
+        except ValueError:
+            return STREAM_SIZE_FALLBACK
+    elif output:
+        match = next((item for item in output_list if item['name'] == output), None)
+        if match is None:
+            return STREAM_SIZE_FALLBACK
+        width, height, scale = match['width'], match['height'], match['scale']
+    else:
+        left, top, right, bottom = outputs.layout_bounds(output_list)
+        width, height = right - left, bottom - top
+    return int(width * scale * height * scale * 4)
+
+def start_streamed_capture(command: list, expected_size: int) -> stream.StreamedCapture:
+    """Start grim and hand back its stdout as it is produced instead of waiting for the whole image."""
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def check():
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, command,
+                                                stderr=process.stderr.read().decode(errors='replace'))
+
+    logging.debug("Streaming screenshot from grim...")
+    return stream.StreamedCapture(process.stdout, check, expected_size)
+
+def upload_screenshot(data, api_key: str, domain: str, settings: dict, cache: dict = None) -> str:
+    """Upload with retries. cache holds the dedup settings; None skips the upload cache entirely."""
+    import requests
+
     if not api_key or not domain:
         notify("Configuration incomplete. Please use the Go client to set up.")
         sys.exit(1)
-    
+
+    # A streamed capture isn't complete until it has been sent, so it can't be looked up first
+    hashes = None
+    if cache and isinstance(data, bytes):
+        with metrics.span('dedup_lookup', bytes=len(data)) as lookup_span:
+            image_url, hashes = dedup.lookup(data, cache['perceptual'], cache['max_age_days'], cache['force'])
+            lookup_span['hit'] = bool(image_url)
+        if image_url:
+            print("Identical screenshot already uploaded, reusing its URL.")
+            return image_url
+
     max_retries = 3
-    base_timeout = 5
+    # A stream's size isn't known until it has been sent, so its timeout allows for the raw pixels
+    size = len(data) if isinstance(data, bytes) else data.expected_size
 
     logging.debug("Uploading screenshot...")
     print("Uploading", end="", flush=True)
 
-    for attempt in range(max_retries):
-        try:
-            headers = {"key": api_key}
-            files = {'file': ('screenshot.png', data, 'image/png')}
-            
-            response = requests.post(UPLOAD_URL, headers=headers, files=files, timeout=base_timeout * (attempt + 1))
-            response.raise_for_status()
+    with metrics.span('upload') as upload_span:
+        session.wait_until_warm()
+        for attempt in range(max_retries):
+            upload_span['attempts'] = attempt + 1
+            try:
+                headers = {"key": api_key}
+                timeout = bandwidth.timeout(size, attempt)
+
+                if isinstance(data, stream.StreamedCapture):
+                    # A stream can only be read once, so it is never hedged
+                    response = stream.post_capture(session.get_session(), UPLOAD_URL, headers, data,
+                                                   encode.filename(settings), encode.mime_type(settings), timeout)
+                    response.raise_for_status()
+                else:
+                    files = {'file': (encode.filename(settings), data, encode.mime_type(settings))}
+
+                    def send(http_session):
+                        return http_session.post(UPLOAD_URL, headers=headers, files=files, timeout=timeout)
+
+                    if hedge.enabled():
+                        # Timed from when the winning request was sent, not from the start of the hedge wait
+                        response, upload_span['hedged'], post_seconds = hedge.post(send, len(data))
+                    else:
+                        post_start = time.perf_counter()
+                        response = send(session.get_session())
+                        response.raise_for_status()
+                        post_seconds = time.perf_counter() - post_start
+                        hedge.record(len(data), post_seconds)
+                    bandwidth.record(len(data), post_seconds)
+                upload_span['bytes'] = data.size if isinstance(data, stream.StreamedCapture) else len(data)
+
+                print("\rUpload complete!", flush=True)
+                logging.debug("Upload successful.")
+                response_json = response.json()
+                image_url = response_json.get('imageUrl')
+                if hashes and image_url:
+                    dedup.store(hashes, image_url, len(data), cache['max_entries'], cache['max_age_days'])
+                return image_url
+
+            except subprocess.CalledProcessError as e:
+                # grim failed part-way through a streamed capture; the partial body was never completed
+                print("\nCapture failed.")
+                logging.error(f"Error taking screenshot: {e.stderr.strip()}")
+                notify(f"Error taking screenshot: {e.stderr.strip()}")
+                sys.exit(1)
+            except requests.RequestException as e:
+                logging.error(f"Upload attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries - 1:
+                    print(".", end="", flush=True)
+                    time.sleep(2 ** attempt + random.uniform(0, 1))
+                else:
+                    print("\nUpload failed.")
+                    notify(f"Upload failed: {e}")
+                    sys.exit(1)
+
+def post_screenshot(data: bytes, api_key: str, filename: str, mime_type: str, timeout: float) -> str:
+    """A single upload attempt, for callers that do their own retrying."""
+    headers = {"key": api_key}
+    files = {'file': (filename, data, mime_type)}
+    response = session.get_session().post(UPLOAD_URL, headers=headers, files=files, timeout=timeout)
+    response.raise_for_status()
+
+    image_url = response.json().get('imageUrl')
+    if not image_url:
+        raise ValueError("Empty or null image URL.")
+    return image_url
+
+def post_or_give_up(data: bytes, api_key: str, filename: str, mime_type: str, timeout: float) -> str:
+    """post_screenshot, raising spool.PermanentError for rejections that retrying cannot fix."""
+    import requests
 
-            print("\rUpload complete!", flush=True)
-            logging.debug("Upload successful.")
-            response_json = response.json()
-            return response_json.get('imageUrl')
+    try:
+        return post_screenshot(data, api_key, filename, mime_type, timeout)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if status is not None and 400 <= status < 500 and status not in (408, 429):
+            raise spool.PermanentError(str(e))
+        raise
+
+def queue_screenshot(data: bytes, settings: dict, domain: str, cache: dict = None) -> None:
+    """Hand the capture to the on-disk queue and make sure a background worker is draining it."""
+    hashes = None
+    if cache:
+        image_url, hashes = dedup.lookup(data, cache['perceptual'], cache['max_age_days'], cache['force'])
+        if image_url:
+            final_url = f"{domain.rstrip('/')}/{image_url.split('/')[-1]}"
+            copy_to_clipboard(final_url)
+            print(f"Identical screenshot already uploaded: {final_url}")
+            return
+
+    with metrics.span('queue', bytes=len(data)):
+        spool.enqueue(data, encode.filename(settings), encode.mime_type(settings), {'hashes': hashes})
+        start_queue_worker()
+
+    depth = len(spool.pending())
+    print(f"Screenshot queued for upload ({depth} in queue).")
+    logging.debug(f"Queued screenshot in {spool.SPOOL_DIR}")
+
+def start_queue_worker() -> None:
+    os.makedirs(spool.SPOOL_DIR, exist_ok=True)
+    with open(os.path.join(spool.SPOOL_DIR, 'worker.log'), 'a') as log:
+        subprocess.Popen([sys.executable, os.path.realpath(__file__), '--drain-queue'],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+
+def drain_queue(config: dict) -> None:
+    """Background worker: upload queued captures, then copy and announce each URL."""
+    api_key = config['api_key']
+    domain = config['domain']
 
-        except requests.RequestException as e:
-            logging.error(f"Upload attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                print(".", end="", flush=True)
-                time.sleep(2 ** attempt + random.uniform(0, 1))
-            else:
-                print("\nUpload failed.")
-                notify(f"Upload failed: {e}")
-                sys.exit(1)
+    def upload(data, entry):
+        return post_or_give_up(data, api_key, entry['filename'], entry['mime_type'],
+                               timeout=max(30, bandwidth.timeout(len(data))))
+
+    cache = dedup.settings_from_config(config)
+
+    def on_uploaded(image_url, entry):
+        if entry.get('hashes'):
+            dedup.store(entry['hashes'], image_url, entry['size'], cache['max_entries'], cache['max_age_days'])
+        final_url = f"{domain.rstrip('/')}/{image_url.split('/')[-1]}"
+        copy_to_clipboard(final_url)
+        logging.warning(f"Uploaded {entry['id']}: {final_url}")
+        notify(f"Screenshot uploaded. URL: {final_url}")
+
+    concurrency = int(config.get('queue_concurrency') or 2)
+    if not spool.drain(upload, on_uploaded, concurrency):
+        logging.debug("Another worker is already draining the upload queue.")
+
+def bulk_upload(paths: list, config: dict, manifest_path: str, cache: dict = None) -> None:
+    """Upload existing files and directories, recording path -> URL in a resumable manifest."""
+    domain = config['domain']
+    files = bulk.expand(paths)
+    if not files:
+        print("No images found.")
+        sys.exit(1)
+
+    def upload(data, filename, mime_type):
+        hashes = None
+        if cache:
+            image_url, hashes = dedup.lookup(data, cache['perceptual'], cache['max_age_days'], cache['force'])
+            if image_url:
+                return f"{domain.rstrip('/')}/{image_url.split('/')[-1]}"
+        post_start = time.perf_counter()
+        image_url = post_or_give_up(data, config['api_key'], filename, mime_type, timeout=bandwidth.timeout(len(data)))
+        bandwidth.record(len(data), time.perf_counter() - post_start)
+        if hashes:
+            dedup.store(hashes, image_url, len(data), cache['max_entries'], cache['max_age_days'])
+        return f"{domain.rstrip('/')}/{image_url.split('/')[-1]}"
+
+    session.prewarm(UPLOAD_URL)
+    concurrency = int(config.get('bulk_concurrency') or bulk.DEFAULT_CONCURRENCY)
+    summary = bulk.run(files, upload, manifest_path, concurrency)
+    print(bulk.format_summary(summary, manifest_path))
+    if summary['interrupted']:
+        sys.exit(130)
+    if summary['failed']:
+        sys.exit(1)
 
 def copy_to_clipboard(text: str) -> None:
+    with metrics.span('clipboard'):
+        _copy_to_clipboard(text)
+
+def _copy_to_clipboard(text: str) -> None:
     if shutil.which('wl-copy'):
         subprocess.run(['wl-copy'], input=text.encode())
     elif shutil.which('xclip'):
@@ -147,61 +470,8 @@ def mask_api_key(api_key: str) -> str:
         return parts[0] + '_' + '*' * (len(parts[1]) - 3) + parts[1][-3:]
     return api_key
 
-def add_text_to_image(image_data, top_text="", bottom_text="", color="white", font_path="~/.config/e-zshot/impact.ttf"):
-    image = Image.open(io.BytesIO(image_data))
-    draw = ImageDraw.Draw(image)
-
-    # Increase base font size for more prominent text
-    base_font_size = int(image.height / 8)  # Increase base size for larger text
-    max_font_size = int(image.height / 3)    # Larger maximum size to handle lower resolutions better
-
-    font_path = os.path.expanduser(font_path)  # Expand user directory in font path
-
-    def get_font(size):
-        try:
-            return ImageFont.truetype(font_path, size)
-        except IOError:
-            return ImageFont.load_default().font_variant(size=size)
-
-    def calculate_text_size(text, font):
-        bbox = draw.textbbox((0, 0), text, font=font)
-        return bbox[2] - bbox[0], bbox[3] - bbox[1]
-
-    def draw_text_with_outline(text, position, font):
-        text_width, text_height = calculate_text_size(text, font)
-        x, y = position
-        # Draw the text with an outline
-        for offset in [(1,1), (-1,-1), (1,-1), (-1,1)]:
-            draw.text((x + offset[0], y + offset[1]), text, font=font, fill="black")
-        draw.text((x, y), text, font=font, fill=color)
-
-    # Adjust font size dynamically for top and bottom text
-    font_size = base_font_size
-    while True:
-        font = get_font(font_size)
-        text_width_top, _ = calculate_text_size(top_text, font) if top_text else (0, 0)
-        text_width_bottom, _ = calculate_text_size(bottom_text, font) if bottom_text else (0, 0)
-        if (text_width_top < image.width - 40 and text_width_bottom < image.width - 40) or font_size >= max_font_size:
-            break
-        font_size += 2  # Increase increment for faster scaling
-
-    # Draw the top text
-    if top_text:
-        font = get_font(font_size)
-        text_width, text_height = calculate_text_size(top_text, font)
-        position = ((image.width - text_width) / 2, 10)
-        draw_text_with_outline(top_text, position, font)
-
-    # Draw the bottom text with extra padding to avoid cutting off
-    if bottom_text:
-        font = get_font(font_size)
-        text_width, text_height = calculate_text_size(bottom_text, font)
-        position = ((image.width - text_width) / 2, image.height - text_height - 20)  # Increased padding from bottom
-        draw_text_with_outline(bottom_text, position, font)
-
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='PNG')
-    return img_byte_arr.getvalue()
+def add_text_to_image(image, top_text="", bottom_text="", color="white", font_path="~/.config/e-zshot/impact.ttf"):
+    return caption.draw_captions(image, top_text, bottom_text, color, os.path.expanduser(font_path))
 
 def parse_color(color_str):
     if color_str.lower() in ['red', 'green', 'blue', 'white', 'black', 'yellow']:
@@ -216,21 +486,159 @@ def parse_color(color_str):
             return f"rgba({values[0]}, {values[1]}, {values[2]}, {values[3]})"
     return "white"
 
-def save_screenshot(data: bytes, save_path: str) -> None:
+def save_screenshot(data, save_path: str, settings: dict) -> str:
     if os.path.isdir(save_path):
-        filename = f"{uuid.uuid4().hex[:8]}.png"
+        filename = f"{uuid.uuid4().hex[:8]}.{encode.extension(settings)}"
         full_path = os.path.join(save_path, filename)
     else:
         full_path = save_path
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
     
-    with open(full_path, 'wb') as f:
-        f.write(data)
+    with metrics.span('save') as save_span:
+        if isinstance(data, stream.StreamedCapture):
+            data.copy_to(full_path)
+            save_span['bytes'] = data.size
+        else:
+            with open(full_path, 'wb') as f:
+                f.write(data)
+            save_span['bytes'] = len(data)
     logging.debug(f"Screenshot saved to {full_path}")
     notify(f"Screenshot saved to {full_path}")
+    return full_path
+
+def resolve_outputs(choice: str) -> list:
+    """Output names to capture for --output; [None] means one grab of the whole layout."""
+    if not choice:
+        return [None]
+    if choice == 'each':
+        names = [output['name'] for output in outputs.list_outputs()]
+        if not names:
+            logging.warning("Could not list outputs; capturing the whole screen.")
+        return names or [None]
+    if choice == 'focused':
+        output = outputs.focused_output()
+        if output is None:
+            logging.warning("Could not find the focused output; capturing the whole screen.")
+            return [None]
+        return [output['name']]
+    return [choice]
+
+def frame_capturer(args, output_names: list, geometry: str):
+    """A function that grabs one raw frame per call, for timelapses and recordings."""
+    if len(output_names) > 1:
+        notify("Repeated captures cover one output; use --output focused or an output name.")
+        sys.exit(1)
+    output = output_names[0]
+    env = detect_environment()
+    if env == 'gnome' and not args.full_screen:
+        # gnome-screenshot can only select a region interactively, which would mean a selection per frame
+        notify("gnome-screenshot can't reuse a selected region; use -f for repeated captures on GNOME.")
+        sys.exit(1)
+    if not (args.full_screen or output or geometry):
+        # Select the region now, before the caller starts its clock, and reuse it for every frame
+        try:
+            geometry = select_area(env)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            logging.error(f"Error selecting an area: {e}")
+            notify(f"Error selecting an area: {e}")
+            sys.exit(1)
+        regions.remember(geometry)
+
+    def capture_frame():
+        # Every frame is compared with the last, so grim always hands over raw pixels
+        data = take_screenshot(args.full_screen, ['-t', 'ppm'], output=output, geometry=geometry)
+        return encode.decode(data)
+
+    return capture_frame
+
+def run_timelapse(args, config: dict, output_names: list, geometry: str, settings: dict, budget: int, cache: dict,
+                  queued: bool, caption_style: tuple = None, redaction: tuple = None) -> None:
+    api_key = config['api_key']
+    domain = config['domain']
+    # Any selection happens here, so the first frame's target time isn't spent waiting on slurp
+    capture_frame = frame_capturer(args, output_names, geometry)
+
+    def handle(image, index):
+        if redaction:
+            with metrics.span('redact', boxes=len(redaction[0]), frame=index):
+                image = redact.apply(image, *redaction)
+        if caption_style:
+            image = add_text_to_image(image, args.top_text, args.bottom_text, *caption_style)
+        with metrics.span('encode', format=settings['format'], frame=index) as encode_span:
+            data = encode.encode_image(image, settings)
+            encode_span['bytes'] = len(data)
+        if args.save_to_disk:
+            save_screenshot(data, args.save_to_disk, settings)
+        if args.no_upload:
+            return None
+
+        upload_settings = settings
+        if budget and len(data) > budget:
+            data, upload_settings = encode.fit_to_budget(image, settings, budget, baseline=data)
+        if queued:
+            queue_screenshot(data, upload_settings, domain, cache)
+            return None
+        image_url = upload_screenshot(data, api_key, domain, upload_settings, cache)
+        return f"{domain.rstrip('/')}/{image_url.split('/')[-1]}" if image_url else None
+
+    frames = timelapse.run(capture_frame, handle, args.interval, args.count, args.threshold / 100)
+    print(timelapse.format_report(frames, args.interval))
+
+def run_recording(args, config: dict, output_names: list, geometry: str, settings: dict, cache: dict,
+                  caption_style: tuple = None, redaction: tuple = None) -> None:
+    api_key = config['api_key']
+    domain = config['domain']
+    problem = animate.frame_limit_error(args.record, args.fps, config)
+    if problem:
+        logging.error(problem)
+        notify(problem)
+        sys.exit(1)
+    capture_frame = frame_capturer(args, output_names, geometry)
+    settings = animate.animation_settings(settings)
+
+    start_time = time.time()
+    with metrics.span('record', fps=args.fps) as record_span:
+        frames = animate.record(capture_frame, args.record, args.fps)
+        record_span['frames'] = len(frames)
+    if redaction:
+        with metrics.span('redact', boxes=len(redaction[0]), frames=len(frames)):
+            frames = [(redact.apply(image, *redaction), duration) for image, duration in frames]
+    if caption_style:
+        # The caption layer is rendered once and pasted onto every frame
+        with metrics.span('overlay', frames=len(frames)):
+            frames = [(add_text_to_image(image, args.top_text, args.bottom_text, *caption_style), duration)
+                      for image, duration in frames]
+    with metrics.span('encode', format=settings['format']) as encode_span:
+        data = animate.encode_animation(frames, settings)
+        encode_span['bytes'] = len(data)
+    print(f"Recorded {len(frames)} distinct frames in {args.record:g}s: {len(data) / 1024:.0f} KiB "
+          f"{settings['format']} (took {time.time() - start_time:.2f}s)")
+
+    saved_path = save_screenshot(data, args.save_to_disk, settings) if args.save_to_disk else None
+    final_url = None
+    if args.no_upload:
+        pass
+    elif str(config.get('background_upload')).lower() == 'true' or args.queue:
+        queue_screenshot(data, settings, domain, cache)
+    else:
+        # The upload size budget is skipped: re-encoding to fit would flatten the animation to one frame
+        image_url = upload_screenshot(data, api_key, domain, settings, cache)
+        if not image_url:
+            notify("Error: Empty or null image URL.")
+            sys.exit(1)
+        final_url = f"{domain.rstrip('/')}/{image_url.split('/')[-1]}"
+        copy_to_clipboard(final_url)
+        print(f"Screenshot URL: {final_url}")
+        notify(f"Recording uploaded. URL: {final_url}")
+
+    if history.enabled(config):
+        history.record('e-z-grim', data, path=saved_path, url=final_url, image_format=settings['format'],
+                       settings=history.settings_from_config(config))
 
 def download_font_if_missing(font_path: str, font_url: str) -> None:
     if not os.path.exists(font_path):
+        import requests
+
         logging.info(f"Font file not found at {font_path}. Downloading...")
         try:
             response = requests.get(font_url, timeout=10)
@@ -243,10 +651,12 @@ def download_font_if_missing(font_path: str, font_url: str) -> None:
             notify(f"Failed to download font: {e}")
             sys.exit(1)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Screenshot tool that uploads to an external server.")
     parser.add_argument('-v', '--verbose', action='store_true', help="Enable verbose logging")
     parser.add_argument('-f', '--full-screen', action='store_true', help="Take a full-screen screenshot")
+    parser.add_argument('--output', type=str, metavar='focused|NAME|each',
+                        help="Capture only the focused output, the named output, or each output as a separate image")
     parser.add_argument('-s', '--save-to-disk', type=str, help="Save the screenshot to the specified path")
     parser.add_argument('-n', '--no-upload', action='store_true', help="Disable uploading the screenshot to API")
     parser.add_argument('-t', '--top-text', type=str, help="Text to add at the top of the image")
@@ -254,54 +664,301 @@ def main():
     parser.add_argument('-c', '--color', type=str, default="white", help="Text color (name, hex, or RGB/RGBA)")
     parser.add_argument('-fpath', '--font-path', type=str, default=os.path.expanduser('~/.config/e-zshot/impact.ttf'),
                         help="Path to the font file (default: ~/.config/e-zshot/impact.ttf)")
-
-    args = parser.parse_args()
+    parser.add_argument('--redact', type=redact.box, action='append', metavar='X,Y,W,H',
+                        help="Pixelate or blur this rectangle of the capture before it is saved or uploaded "
+                             "(repeatable)")
+    parser.add_argument('--redact-preset', type=str, action='append', metavar='NAME',
+                        help="Redact the rectangles of a preset from redact_presets in the config (repeatable)")
+    parser.add_argument('--redact-mode', choices=redact.MODES, help="How to redact (default: pixelate)")
+    parser.add_argument('-r', '--region', type=str, metavar='last|window|NAME',
+                        help="Capture the last region, the focused window or a region preset without selecting")
+    parser.add_argument('--save-region', type=str, metavar='NAME',
+                        help="Save the captured region as a preset for --region")
+    parser.add_argument('--interval', type=float, metavar='SECONDS',
+                        help="Timelapse: capture every SECONDS and upload the frames where the screen changed")
+    parser.add_argument('--count', type=int, default=0, help="Number of timelapse frames (default: until Ctrl+C)")
+    parser.add_argument('--threshold', type=float, default=0.5, metavar='PERCENT',
+                        help="Share of the screen that must change for a timelapse frame to be kept (default 0.5)")
+    parser.add_argument('--record', type=float, metavar='SECONDS',
+                        help="Record an animated WebP (or GIF, if that is the image_type) for SECONDS")
+    parser.add_argument('--fps', type=float, default=animate.DEFAULT_FPS, help="Frames per second for --record")
+    parser.add_argument('--freeze', action='store_true',
+                        help="Freeze the screen while selecting and crop the selection from that frame")
+    parser.add_argument('--stream', action='store_true',
+                        help="Upload grim's output while it is still being captured and encoded")
+    parser.add_argument('-q', '--queue', action='store_true',
+                        help="Queue the upload on disk and return immediately; a background worker uploads it")
+    parser.add_argument('--queue-status', action='store_true', help="Show the background upload queue and exit")
+    parser.add_argument('--drain-queue', action='store_true', help="Upload everything in the queue, then exit")
+    parser.add_argument('--bulk', nargs='+', metavar='PATH',
+                        help="Upload existing files, globs or directories instead of taking a screenshot")
+    parser.add_argument('--manifest', type=str, default='e-zshot-manifest.jsonl',
+                        help="Where --bulk records each path and URL; reusing it resumes an interrupted run")
+    parser.add_argument('--force-upload', action='store_true',
+                        help="Upload even if an identical screenshot was uploaded before")
+    parser.add_argument('--cache-stats', action='store_true', help="Show upload cache hit rates and exit")
+    parser.add_argument('--history', nargs='?', const='', metavar='TEXT',
+                        help="List past screenshots, newest first: all, those whose URL or path contains TEXT, "
+                             "or the uploads of the file TEXT")
+    parser.add_argument('--limit', type=int, default=history.DEFAULT_LIMIT,
+                        help=f"Entries shown by --history (default {history.DEFAULT_LIMIT})")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile with cProfile and tracemalloc; both are saved under ~/.config/e-zshot/profiles")
+    parser.add_argument('--hedge', action='store_true',
+                        help="Send a second upload on a new connection if the first is slower than usual")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Print how long each startup stage took before and after the capture")
+
+    args = parser.parse_args(argv)
+    if args.record is not None and args.record <= 0:
+        parser.error("--record must be a positive number of seconds")
+    if args.fps <= 0:
+        parser.error("--fps must be positive")
+    if args.interval is not None and args.interval <= 0:
+        parser.error("--interval must be a positive number of seconds")
+    if args.count < 0:
+        parser.error("--count can't be negative")
+    with metrics.recording('e-z-grim', profile=args.profile):
+        take_and_upload(args)
+    # The URL is already out; this only waits to report a hedged upload that went through twice.
+    # The daemon does it itself once the client has its reply
+    if not os.environ.get('EZSHOT_DAEMON'):
+        hedge.settle()
+
+def take_and_upload(args) -> None:
+    startup.begin()
 
     configure_logging(args.verbose)
     
     config = load_config()
     api_key = config['api_key']
     domain = config['domain']
+    metrics.configure(config)
+    hedge.configure(config, enabled=args.hedge)
+
+    if args.history is not None:
+        print(history.format_entries(history.query(args.history, args.limit)))
+        return
+
+    if args.cache_stats:
+        print(dedup.format_stats())
+        print(hedge.format_stats())
+        print(bandwidth.format_estimate())
+        return
+    if args.queue_status:
+        print(spool.format_status(spool.status()))
+        return
+    if args.drain_queue:
+        drain_queue(config)
+        return
+
+    queued = args.queue or str(config.get('background_upload')).lower() == 'true'
 
     # Define the default font path and URL
     default_font_path = os.path.expanduser('~/.config/e-zshot/impact.ttf')
     font_url = 'https://raw.githubusercontent.com/sophilabs/macgifer/master/static/font/impact.ttf'
 
-    # Download the font if it's not available
-    download_font_if_missing(default_font_path, font_url)
-
-    # Use the specified or default font path
-    font_path = args.font_path if os.path.isfile(args.font_path) else default_font_path
-    
-    screenshot_data = take_screenshot(args.full_screen)
-
-    if args.top_text or args.bottom_text:
+    settings = encode.settings_from_config(config)
+    budget = encode.parse_size(config.get('max_upload_size'))
+    # Only the upload is fitted to a slow link; the configured budget alone decides whether to stream
+    upload_budget = bandwidth.effective_budget(budget, config)
+    cache = dedup.settings_from_config(config)
+    if not cache['enabled']:
+        cache = None
+    elif args.force_upload:
+        # The stale entry is still replaced by the new upload's URL
+        cache = dict(cache, force=True)
+    if args.bulk:
+        bulk_upload(args.bulk, config, args.manifest, cache)
+        return
+    captions = args.top_text or args.bottom_text
+    redaction = resolve_redactions(args, config)
+    if redaction and cache and cache['perceptual']:
+        # A near-duplicate match could hand out the URL of an earlier, unredacted shot of the same screen
+        cache = dict(cache, perceptual=False)
+
+    startup.mark('config loaded')
+    output_names = resolve_outputs(args.output)
+    geometry = resolve_region(args.region, config) if args.region else None
+    # Let grim encode PNG/JPEG itself when nothing else touches the pixels. Otherwise grim hands
+    # over raw PPM, which decodes for free, and the image is encoded exactly once at the end
+    grim_format = encode.grim_args(settings)
+    # A frozen selection is cropped from one full grab instead of capturing a second time
+    freeze = ((args.freeze or str(config.get('freeze_selection')).lower() == 'true')
+              and not args.full_screen and not args.output and not args.region and detect_environment() == 'wayland')
+    needs_pixels = grim_format is None or captions or redaction or freeze
+    # Streaming only works when nothing needs to look at the finished image before it is sent
+    streaming = ((args.stream or str(config.get('stream_upload')).lower() == 'true')
+                 and not needs_pixels and not budget and not args.no_upload and not queued
+                 and len(output_names) == 1)
+    if needs_pixels:
+        grim_format = ['-t', 'ppm']
+
+    if captions:
+        # Only captions need the font, so don't touch the network for it otherwise
+        if not os.path.isfile(args.font_path):
+            download_font_if_missing(default_font_path, font_url)
+
+        # Use the specified or default font path
+        font_path = args.font_path if os.path.isfile(args.font_path) else default_font_path
         color = parse_color(args.color)
-        screenshot_data = add_text_to_image(screenshot_data, args.top_text, args.bottom_text, color, font_path)
 
-    if args.save_to_disk:
-        save_screenshot(screenshot_data, args.save_to_disk)
-    
-    if not args.no_upload:
+    if not args.no_upload and not queued:
+        # Do the DNS/TCP/TLS setup while the user is busy selecting a region
+        session.prewarm(UPLOAD_URL)
+
+    if args.record:
+        run_recording(args, config, output_names, geometry, settings, cache,
+                      (color, font_path) if captions else None, redaction)
+        return
+    if args.interval:
+        run_timelapse(args, config, output_names, geometry, settings, upload_budget, cache, queued,
+                      (color, font_path) if captions else None, redaction)
+        return
+
+    def capture_output(output):
+        if freeze:
+            screenshot_data = None
+            image = take_frozen_screenshot()
+            startup.mark('capture done')
+        else:
+            screenshot_data = take_screenshot(args.full_screen, grim_format, streaming, output, geometry)
+            if isinstance(screenshot_data, stream.StreamedCapture):
+                return screenshot_data, None
+            startup.mark('capture done')
+
+            # gnome-screenshot always produces PNG, so decode whatever came back rather than assuming PPM
+            image = None
+            if needs_pixels:
+                with metrics.span('decode', bytes=len(screenshot_data)):
+                    image = encode.decode(screenshot_data)
+        # Redaction and captions work on the same decoded pixels, which are then encoded once
+        if redaction:
+            with metrics.span('redact', boxes=len(redaction[0])):
+                image = redact.apply(image, *redaction)
+        if captions:
+            with metrics.span('overlay'):
+                image = add_text_to_image(image, args.top_text, args.bottom_text, color, font_path)
+
+        with metrics.span('encode', format=settings['format']) as encode_span:
+            if image is not None:
+                screenshot_data = encode.encode_image(image, settings)
+            else:
+                screenshot_data = encode.ensure_format(screenshot_data, settings)
+            encode_span['bytes'] = len(screenshot_data)
+        return screenshot_data, image
+
+    if len(output_names) > 1:
+        # Each output is captured and encoded on its own thread; grim runs as separate processes
+        # and Pillow drops the GIL while encoding, so the work spreads across cores
+        with ThreadPoolExecutor(max_workers=len(output_names)) as pool:
+            shots = list(pool.map(capture_output, output_names))
+    else:
+        shots = [capture_output(output_names[0])]
+    streamed = isinstance(shots[0][0], stream.StreamedCapture)
+    if args.save_region:
+        if geometry or not (args.full_screen or args.output) and regions.last():
+            save_region(args.save_region, regions.last())
+        else:
+            logging.warning("This wasn't a region capture, so there is no region to save.")
+    startup.mark('capture started' if streamed else 'encode done')
+
+    # Everything after encoding runs concurrently; only the clipboard has to wait for the URLs
+    pipeline = stages.Pipeline()
+
+    def fit_upload(screenshot_data, image):
+        # Slow links can cap the upload size; the copy saved to disk keeps the configured encoding
+        if streamed:
+            return screenshot_data, settings
+        if image is not None and upload_budget and len(screenshot_data) > upload_budget:
+            # The pixels are already decoded, so the budget search doesn't need to decode again
+            return encode.fit_to_budget(image, settings, upload_budget, baseline=screenshot_data)
+        return encode.fit_bytes_to_budget(screenshot_data, settings, upload_budget)
+
+    def upload(screenshot_data, image):
+        upload_data, upload_settings = fit_upload(screenshot_data, image)
         start_time = time.time()
-        image_url = upload_screenshot(screenshot_data, api_key, domain)
+        image_url = upload_screenshot(upload_data, api_key, domain, upload_settings, cache)
         elapsed_time = time.time() - start_time
-        
+        startup.mark('upload done')
+
         if not image_url:
             notify("Error: Empty or null image URL.")
             sys.exit(1)
 
-        final_url = f"{domain.rstrip('/')}/{image_url.split('/')[-1]}"
-        copy_to_clipboard(final_url)
+        return f"{domain.rstrip('/')}/{image_url.split('/')[-1]}", elapsed_time
+
+    def remember(data, image, stage_names, *results):
+        done = dict(zip(stage_names, results))
+        saved_path = next((result for name, result in done.items() if name.startswith('save')), None)
+        uploaded = next((result for name, result in done.items() if name.startswith('upload')), None)
+        # A streamed capture is read back from the saved copy, if there is one
+        history.record('e-z-grim', data if isinstance(data, bytes) else None, image, saved_path,
+                       uploaded[0] if uploaded else None, settings['format'], history.settings_from_config(config))
+
+    uploads = []
+    history_stages = []
+    for output, (screenshot_data, image) in zip(output_names, shots):
+        suffix = f" {output}" if len(shots) > 1 else ''
+        save = lambda *_, data=screenshot_data: save_screenshot(data, args.save_to_disk, settings)
+        recorded_stages = []
+
+        # A streamed capture is saved from its spool after the upload, so the disk write doesn't stall the pipe
+        if args.save_to_disk and not streamed:
+            pipeline.add('save' + suffix, save)
+            recorded_stages.append('save' + suffix)
+
+        if args.no_upload:
+            pass
+        elif queued:
+            pipeline.add('queue' + suffix,
+                         lambda data=screenshot_data, image=image: queue_screenshot(*fit_upload(data, image), domain, cache))
+        else:
+            pipeline.add('upload' + suffix, lambda data=screenshot_data, image=image: upload(data, image))
+            uploads.append('upload' + suffix)
+            recorded_stages.append('upload' + suffix)
+            if streamed and args.save_to_disk:
+                pipeline.add('save' + suffix, save, after=['upload' + suffix])
+                recorded_stages.append('save' + suffix)
+
+        if history.enabled(config) and recorded_stages:
+            # Joined only after the URL has been printed and notified, so the thumbnail and the database
+            # write don't delay it
+            pipeline.add('history' + suffix,
+                         lambda *results, data=screenshot_data, image=image, names=tuple(recorded_stages):
+                         remember(data, image, names, *results),
+                         after=recorded_stages)
+            history_stages.append('history' + suffix)
+
+    if args.no_upload:
+        logging.debug("Screenshot not uploaded.")
+    if uploads:
+        # A batch goes to the clipboard as one URL per line
+        pipeline.add('clipboard', lambda *results: copy_to_clipboard('\n'.join(url for url, _ in results)),
+                     after=uploads)
+
+    results = pipeline.wait([name for name in pipeline.futures if name not in history_stages])
+
+    if uploads:
         masked_api_key = mask_api_key(api_key)
-        
-        print(f"Screenshot URL: {final_url} (took {elapsed_time:.2f}s)")
+        final_urls = []
+        for name in uploads:
+            final_url, elapsed_time = results[name]
+            final_urls.append(final_url)
+            print(f"Screenshot URL: {final_url} (took {elapsed_time:.2f}s)")
         if args.verbose:
             print(f"API Key: {masked_api_key}")
-        
-        notify(f"Screenshot uploaded. URL: {final_url}")
-    else:
-        logging.debug("Screenshot not uploaded.")
+
+        notify(f"Screenshot uploaded. URL: {final_urls[0]}" if len(final_urls) == 1
+               else f"{len(final_urls)} screenshots uploaded:\n" + '\n'.join(final_urls))
+
+    pipeline.wait()
+    if streamed:
+        shots[0][0].close()
+
+    if args.startup_report:
+        startup.mark('done')
+        startup.report()
 
 if __name__ == "__main__":
     main()
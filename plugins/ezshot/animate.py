@@ -0,0 +1,108 @@
+"""Short screen recordings encoded as animated WebP or GIF.
+
+Frames are grabbed on a fixed schedule and consecutive identical frames are merged into one longer frame
+before encoding. Every distinct frame is held in memory until the recording ends, so the number of
+frames (duration times fps) is capped by ``record_max_frames`` in config.json. Each frame's duration comes from when it was actually captured, so playback speed stays
+right even when the capture can't keep up with the requested rate. GIF frames share one palette, built
+from a sample of the whole recording, and are mapped onto it without dithering so that unchanged areas stay
+byte-identical between frames. Pillow's GIF writer and libwebp's animation encoder then only store
+the changed bounding box of each frame.
+"""
+
+import io
+import logging
+import math
+import time
+
+# Recordings are for sharing in a browser; anything wider is halved until it fits
+MAX_WIDTH = 1920
+DEFAULT_FPS = 10
+# A 1920-wide frame is about 6 MiB, so this is under 2 GiB at worst (30 seconds at 10 fps)
+DEFAULT_MAX_FRAMES = 300
+
+def animation_settings(settings: dict) -> dict:
+    """GIF if that is the configured image_type, animated WebP otherwise."""
+    if settings['format'] in ('gif', 'webp'):
+        return settings
+    return dict(settings, format='webp')
+
+def frame_limit_error(duration: float, fps: float, config: dict):
+    """Why a recording of ``duration`` seconds at ``fps`` is too long for the config, or None if it isn't."""
+    limit = int(config.get('record_max_frames') or DEFAULT_MAX_FRAMES)
+    if math.ceil(duration * fps) > limit:
+        return (f"Recording {duration:g}s at {fps:g} fps takes more than {limit} frames; "
+                f"shorten it, lower --fps or raise record_max_frames")
+    return None
+
+def _fit_width(image):
+    factor = 1
+    while image.width // factor > MAX_WIDTH:
+        factor *= 2
+    return image.reduce(factor) if factor > 1 else image
+
+def record(capture, duration: float, fps: float = DEFAULT_FPS) -> list:
+    """Call ``capture()`` (returning a PIL image) ``fps`` times a second for ``duration`` seconds.
+
+    Returns a list of (image, duration_ms) with identical consecutive frames merged.
+    """
+    from PIL import ImageChops
+
+    interval = 1 / fps
+    frames = []
+    start = time.monotonic()
+    index = 0
+
+    while index * interval < duration:
+        delay = start + index * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        taken = time.monotonic()
+        image = _fit_width(capture().convert('RGB'))
+        if frames and ImageChops.difference(frames[-1][0], image).getbbox() is None:
+            logging.debug(f"Frame {index} unchanged, merged into the previous frame")
+        else:
+            frames.append((image, taken))
+        # When a capture overruns its slot, skip to the next one rather than bunching frames up
+        index = max(index + 1, math.ceil((time.monotonic() - start) / interval))
+
+    end = max(time.monotonic(), start + duration)
+    times = [taken for _, taken in frames] + [end]
+    return [(image, max(20, round((times[i + 1] - taken) * 1000))) for i, (image, taken) in enumerate(frames)]
+
+def _shared_palette(images: list):
+    """One palette for the whole recording, quantized from a strip of evenly spaced frames."""
+    from PIL import Image
+
+    sample = images[::max(1, len(images) // 4)][:4]
+    thumbs = [image.reduce(max(1, image.width // 480)) for image in sample]
+    strip = Image.new('RGB', (sum(thumb.width for thumb in thumbs), max(thumb.height for thumb in thumbs)))
+    x = 0
+    for thumb in thumbs:
+        strip.paste(thumb, (x, 0))
+        x += thumb.width
+    return strip.quantize(256, method=Image.Quantize.MEDIANCUT)
+
+def encode_animation(frames: list, settings: dict) -> bytes:
+    """Encode (image, duration_ms) frames as the format in ``settings`` (gif or webp)."""
+    from PIL import Image
+
+    images = [image for image, _ in frames]
+    durations = [duration for _, duration in frames]
+    output = io.BytesIO()
+    start_time = time.perf_counter()
+
+    if settings['format'] == 'gif':
+        palette = _shared_palette(images)
+        images = [image.quantize(palette=palette, dither=Image.Dither.NONE) for image in images]
+        images[0].save(output, format='GIF', save_all=True, append_images=images[1:], duration=durations, loop=0)
+    else:
+        lossless = settings.get('lossless', True)
+        images[0].save(output, format='WEBP', save_all=True, append_images=images[1:], duration=durations, loop=0,
+                       lossless=lossless, quality=settings['quality'], method=round(settings['level'] * 6 / 9),
+                       allow_mixed=not lossless)
+
+    data = output.getvalue()
+    logging.debug(f"Encoded {len(images)} frames as {settings['format']} in {time.perf_counter() - start_time:.2f}s: "
+                  f"{len(data) / 1024:.0f} KiB")
+    return data
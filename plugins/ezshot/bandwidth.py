@@ -0,0 +1,119 @@
+"""Upload throughput estimate, kept across runs, for size-proportional timeouts and slow-link encoding.
+
+Each completed upload updates two exponentially weighted moving averages in BANDWIDTH_FILE: the fixed
+per-request overhead (connection reuse, server processing) and the throughput of the body itself. Only
+uploads large enough for the transfer to dominate update the throughput, so a run of small crops doesn't
+make the link look slower than it is.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import time
+
+BANDWIDTH_FILE = os.path.expanduser('~/.config/e-zshot/bandwidth.json')
+LOCK_FILE = BANDWIDTH_FILE + '.lock'
+
+# Weight of the newest sample in the moving averages
+ALPHA = 0.3
+# Uploads smaller than this only update the overhead
+MIN_THROUGHPUT_SAMPLE = 128 * 1024
+# Assumed until an upload has been measured
+DEFAULT_THROUGHPUT = 512 * 1024
+DEFAULT_OVERHEAD = 0.5
+# Timeouts allow this many times the expected upload time, within these bounds
+SAFETY_FACTOR = 3
+MIN_TIMEOUT = 2
+MAX_TIMEOUT = 600
+# Throughput samples needed before the link is trusted to be slow
+MIN_SAMPLES = 3
+DEFAULT_SLOW_LINK_SECONDS = 10
+
+class _Locked:
+    """Hold an exclusive lock on the estimate for a read-modify-write."""
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+        self.lock_file = open(LOCK_FILE, 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock_file.close()
+
+def _load() -> dict:
+    try:
+        with open(BANDWIDTH_FILE, 'r') as f:
+            estimate = json.load(f)
+    except (OSError, ValueError):
+        estimate = {}
+    estimate.setdefault('throughput', None)
+    estimate.setdefault('overhead', None)
+    estimate.setdefault('samples', 0)
+    return estimate
+
+def _save(estimate: dict) -> None:
+    tmp_path = BANDWIDTH_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(estimate, f)
+    os.replace(tmp_path, BANDWIDTH_FILE)
+
+def _average(old, new: float) -> float:
+    return new if old is None else old + ALPHA * (new - old)
+
+def record(size: int, seconds: float) -> None:
+    """Fold one upload of size bytes, which took seconds from request to response, into the estimate."""
+    try:
+        with _Locked():
+            estimate = _load()
+            throughput = estimate['throughput'] or DEFAULT_THROUGHPUT
+            overhead = estimate['overhead'] if estimate['overhead'] is not None else DEFAULT_OVERHEAD
+
+            if size >= MIN_THROUGHPUT_SAMPLE:
+                # What is left after the usual overhead is the transfer; never credit it with less than 10%
+                transfer = max(seconds - overhead, seconds * 0.1, 1e-3)
+                estimate['throughput'] = _average(estimate['throughput'], size / transfer)
+                estimate['samples'] += 1
+                throughput = estimate['throughput']
+            estimate['overhead'] = _average(estimate['overhead'], max(0.0, seconds - size / throughput))
+            estimate['updated'] = time.time()
+            _save(estimate)
+    except OSError as e:
+        logging.debug(f"Could not update {BANDWIDTH_FILE}: {e}")
+
+def expected_seconds(size: int, estimate: dict = None) -> float:
+    estimate = estimate or _load()
+    overhead = estimate['overhead'] if estimate['overhead'] is not None else DEFAULT_OVERHEAD
+    return overhead + size / (estimate['throughput'] or DEFAULT_THROUGHPUT)
+
+def timeout(size: int, attempt: int = 0) -> float:
+    """Timeout for uploading size bytes, growing with each retry."""
+    seconds = MIN_TIMEOUT + SAFETY_FACTOR * expected_seconds(size)
+    return min(MAX_TIMEOUT, seconds * (attempt + 1))
+
+def link_budget(config: dict) -> int:
+    """Byte budget that keeps an upload under slow_link_seconds on a link measured as slow (0 for none)."""
+    value = config.get('slow_link_seconds')
+    target = DEFAULT_SLOW_LINK_SECONDS if value in (None, '') else float(value)
+    estimate = _load()
+    if target <= 0 or estimate['samples'] < MIN_SAMPLES:
+        return 0
+    overhead = estimate['overhead'] or 0
+    return max(1, int((target - min(overhead, target / 2)) * estimate['throughput']))
+
+def effective_budget(budget: int, config: dict) -> int:
+    """The configured byte budget, tightened to the link budget when that is smaller."""
+    slow = link_budget(config)
+    if slow and (not budget or slow < budget):
+        logging.debug(f"Upload link measured at {_load()['throughput'] / 1024:.0f} KiB/s; uploads over "
+                      f"{slow / 1024:.0f} KiB are re-encoded to fit")
+        return slow
+    return budget
+
+def format_estimate() -> str:
+    estimate = _load()
+    if not estimate['samples']:
+        return "Upload bandwidth: not measured yet"
+    return (f"Upload bandwidth: {estimate['throughput'] / 1024:.0f} KiB/s, overhead {estimate['overhead']:.2f}s "
+            f"per upload ({estimate['samples']} measurements)")
@@ -0,0 +1,163 @@
+"""Upload existing files in bulk, resumably, with a bounded pool of workers sharing one session.
+
+Progress is recorded in a JSONL manifest, one line per uploaded file with its path and URL. Files already
+in the manifest with the same size and modification time are skipped, so an interrupted run picks up where
+it left off when started again with the same manifest.
+"""
+
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import encode, session, spool
+
+IMAGE_EXTENSIONS = {info['ext'] for info in encode.FORMATS.values()} | {'jpeg'}
+ATTEMPTS = 3
+DEFAULT_CONCURRENCY = 4
+
+def expand(paths: list) -> list:
+    """Files named directly, matched by a glob, or found (as images) under a directory."""
+    files = []
+    for path in paths:
+        path = os.path.expanduser(path)
+        matches = glob.glob(path, recursive=True) if glob.has_magic(path) else [path]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    files.extend(os.path.join(root, name) for name in names
+                                 if name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS)
+            elif os.path.isfile(match):
+                files.append(match)
+            else:
+                logging.warning(f"Skipping {match}: no such file")
+
+    seen = set()
+    unique = []
+    for path in (os.path.abspath(path) for path in files):
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return sorted(unique)
+
+def _key(path: str) -> str:
+    stat = os.stat(path)
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def load_manifest(manifest_path: str) -> dict:
+    done = {}
+    try:
+        with open(manifest_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                done[record['key']] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+def _upload_file(path: str, upload) -> tuple:
+    with open(path, 'rb') as f:
+        data = f.read()
+    image_format = encode.sniff_format(data)
+    if image_format is None:
+        raise spool.PermanentError("not a PNG, JPEG, WebP or GIF image")
+    settings = {'format': image_format}
+
+    for attempt in range(ATTEMPTS):
+        try:
+            return upload(data, os.path.basename(path), encode.mime_type(settings)), len(data)
+        except spool.PermanentError:
+            raise
+        except Exception as e:
+            if attempt == ATTEMPTS - 1:
+                raise
+            logging.debug(f"Upload of {path} failed (attempt {attempt + 1}), retrying: {e}")
+            time.sleep(2 ** attempt)
+
+def run(files: list, upload, manifest_path: str, concurrency: int = DEFAULT_CONCURRENCY) -> dict:
+    """Upload ``files`` with ``upload(data, filename, mime_type) -> url``, recording each in the manifest.
+
+    Ctrl+C stops the run early; the summary then has ``interrupted`` set instead of the exception propagating.
+    """
+    done = load_manifest(manifest_path)
+    # Keyed by size and mtime as they were when the upload was queued, not when it finished
+    keys = {path: _key(path) for path in files}
+    todo = [path for path in files if keys[path] not in done]
+    total_bytes = sum(os.path.getsize(path) for path in todo)
+    # More workers than pooled connections would just open and throw away extra connections
+    concurrency = max(1, min(concurrency, session.POOL_SIZE))
+
+    summary = {'total': len(files), 'skipped': len(files) - len(todo), 'uploaded': 0, 'failed': [],
+               'bytes': 0, 'elapsed': 0, 'interrupted': False}
+    if not todo:
+        return summary
+
+    start_time = time.perf_counter()
+    with open(manifest_path, 'a') as manifest:
+        def finish(future, path):
+            try:
+                url, size = future.result()
+            except Exception as e:
+                logging.error(f"Failed to upload {path}: {e}")
+                summary['failed'].append(path)
+            else:
+                # Flushed per file so an interrupted run loses nothing that was already uploaded
+                manifest.write(json.dumps({'key': keys[path], 'path': path, 'url': url, 'size': size,
+                                           'uploaded': time.time()}) + '\n')
+                manifest.flush()
+                summary['uploaded'] += 1
+                summary['bytes'] += size
+
+            elapsed = time.perf_counter() - start_time
+            finished = summary['uploaded'] + len(summary['failed'])
+            sys.stderr.write(f"\r[{finished}/{len(todo)}] {summary['bytes'] / 1048576:.1f} of "
+                             f"{total_bytes / 1048576:.1f} MiB, {summary['bytes'] / 1048576 / elapsed:.2f} MiB/s")
+            sys.stderr.flush()
+
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        futures = {pool.submit(_upload_file, path, upload): path for path in todo}
+        pending = set(futures)
+        try:
+            for future in as_completed(futures):
+                pending.discard(future)
+                finish(future, futures[future])
+        except KeyboardInterrupt:
+            # Drop the queued files; uploads already on the wire can't be stopped and the interpreter waits
+            # for them on exit anyway, so record them too rather than upload them again on the next run
+            summary['interrupted'] = True
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+                in_flight = [future for future in pending if not future.cancelled()]
+                sys.stderr.write(f"\nInterrupted; recording {len(in_flight)} uploads already in progress "
+                                 f"(Ctrl+C again to stop waiting)\n")
+                for future in as_completed(in_flight):
+                    finish(future, futures[future])
+            except KeyboardInterrupt:
+                # Whatever is still on the wire is uploaded again on the next run
+                pass
+        finally:
+            pool.shutdown(wait=False)
+    sys.stderr.write('\n')
+
+    summary['elapsed'] = time.perf_counter() - start_time
+    return summary
+
+def format_summary(summary: dict, manifest_path: str) -> str:
+    lines = [f"{summary['uploaded']} uploaded, {summary['skipped']} already in the manifest, "
+             f"{len(summary['failed'])} failed, of {summary['total']} files"]
+    if summary['elapsed']:
+        lines.append(f"{summary['bytes'] / 1048576:.1f} MiB in {summary['elapsed']:.1f}s "
+                     f"({summary['bytes'] / 1048576 / summary['elapsed']:.2f} MiB/s, "
+                     f"{summary['uploaded'] / summary['elapsed']:.1f} files/s)")
+    if summary.get('interrupted'):
+        lines.append("Interrupted; run the same command again to upload the rest.")
+    elif summary['failed']:
+        lines.append("Run the same command again to retry the failed files.")
+    lines.append(f"Manifest: {manifest_path}")
+    return '\n'.join(lines)
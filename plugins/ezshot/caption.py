@@ -0,0 +1,90 @@
+"""Caption overlay engine shared by the grim and flameshot plugins.
+
+Fonts are cached per (path, size), the caption size is found by binary search instead of stepping
+through sizes, and each caption is rendered once into a transparent layer with a single stroked pass.
+Rendered layers are kept in an LRU cache, so repeating a caption (timelapses, retakes, a resident
+daemon) only costs a paste.
+"""
+
+from functools import lru_cache
+
+MIN_FONT_SIZE = 8
+SIDE_MARGIN = 40
+TOP_MARGIN = 10
+BOTTOM_MARGIN = 20
+
+@lru_cache(maxsize=64)
+def get_font(font_path: str, size: int):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(font_path, size)
+    except IOError:
+        return ImageFont.load_default().font_variant(size=size)
+
+def text_width(text: str, font_path: str, size: int, stroke_width: int = 0) -> int:
+    left, _, right, _ = get_font(font_path, size).getbbox(text, stroke_width=stroke_width)
+    return right - left
+
+def fit_font_size(texts: list, font_path: str, max_width: int, preferred: int) -> int:
+    """Largest size up to ``preferred`` at which every text fits in max_width, by binary search."""
+    texts = [text for text in texts if text]
+    if not texts:
+        return preferred
+
+    def fits(size):
+        return all(text_width(text, font_path, size, outline_width(size)) < max_width for text in texts)
+
+    if fits(preferred):
+        return preferred
+
+    low, high = MIN_FONT_SIZE, preferred
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def outline_width(size: int) -> int:
+    return max(1, round(size / 40))
+
+@lru_cache(maxsize=32)
+def render_caption(text: str, font_path: str, size: int, color: str, stroke_width: int):
+    """Render a caption into a tight RGBA layer; returns (layer, offset of the layer from the text origin)."""
+    from PIL import Image, ImageDraw
+
+    font = get_font(font_path, size)
+    left, top, right, bottom = font.getbbox(text, stroke_width=stroke_width)
+    layer = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+    ImageDraw.Draw(layer).text((-left, -top), text, font=font, fill=color,
+                               stroke_width=stroke_width, stroke_fill='black')
+    return layer, (left, top)
+
+def draw_captions(image, top_text=None, bottom_text=None, color='white', font_path='', font_size=None,
+                  outline=True):
+    """Draw centred top and bottom captions onto ``image`` in place and return it.
+
+    Without font_size the size scales with the image height and shrinks until the captions fit.
+    """
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    if font_size is None:
+        font_size = fit_font_size([top_text, bottom_text], font_path, image.width - SIDE_MARGIN,
+                                  max(MIN_FONT_SIZE, image.height // 8))
+    stroke_width = outline_width(font_size) if outline else 0
+
+    for text, is_bottom in ((top_text, False), (bottom_text, True)):
+        if not text:
+            continue
+        layer, (_, offset_y) = render_caption(text, font_path, font_size, color, stroke_width)
+        x = (image.width - layer.width) // 2
+        if is_bottom:
+            y = image.height - layer.height - BOTTOM_MARGIN
+        else:
+            y = TOP_MARGIN + offset_y
+        image.paste(layer, (x, y), layer)
+
+    return image
@@ -0,0 +1,63 @@
+"""Get image bytes from capture tools that insist on writing to a file path.
+
+The path handed to the tool points at an anonymous memfd, so nothing touches the disk and concurrent
+captures cannot clobber each other's file. Where memfds or /proc aren't available, or a tool can't write
+through the fd link (for example because it writes a temporary file and renames it over the target), the
+capture falls back to a private file in $XDG_RUNTIME_DIR (a tmpfs on most systems), and the fallback is
+remembered for the rest of the process. A tool that fails or writes nothing is only retried that way when
+the capture isn't interactive: for a region selection it usually means the user cancelled, and running
+the tool again would ask them a second time.
+"""
+
+import logging
+import os
+import subprocess
+import tempfile
+
+_memfd_works = hasattr(os, 'memfd_create') and os.access(f"/proc/{os.getpid()}/fd", os.R_OK | os.X_OK)
+
+def _run(command: list, **kwargs) -> None:
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **kwargs)
+
+def _via_memfd(build_command) -> bytes:
+    fd = os.memfd_create('e-zshot', 0)
+    with os.fdopen(fd, 'rb') as f:
+        _run(build_command(f"/proc/{os.getpid()}/fd/{fd}"), pass_fds=(fd,))
+        f.seek(0)
+        return f.read()
+
+def _via_tempfile(build_command, suffix: str) -> bytes:
+    fd, path = tempfile.mkstemp(prefix='e-zshot-', suffix=suffix, dir=os.environ.get('XDG_RUNTIME_DIR') or None)
+    os.close(fd)
+    try:
+        _run(build_command(path))
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+def capture_to_memory(build_command, suffix: str = '.png', interactive: bool = False) -> bytes:
+    """Run ``build_command(path)`` and return what the tool wrote to ``path``.
+
+    interactive is set when the tool lets the user select or cancel; its failures aren't retried.
+    Raises subprocess.CalledProcessError (with stderr as bytes) if the tool fails.
+    """
+    global _memfd_works
+    if _memfd_works:
+        try:
+            data = _via_memfd(build_command)
+            if data or interactive:
+                return data
+            problem = "the tool wrote nothing"
+        except OSError as e:
+            problem = str(e)
+        except subprocess.CalledProcessError as e:
+            if interactive:
+                raise
+            problem = str(e)
+        data = _via_tempfile(build_command, suffix)
+        # Only remembered once the file works, so a tool that fails both ways keeps its memfd for next time
+        logging.debug(f"Capture into a memfd failed ({problem}), using a file from now on")
+        _memfd_works = False
+        return data
+    return _via_tempfile(build_command, suffix)
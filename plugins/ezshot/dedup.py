@@ -0,0 +1,170 @@
+"""Content-hash cache of past uploads, so the same screenshot is never sent twice.
+
+The index maps the SHA-256 of the encoded bytes to the ``imageUrl`` the API returned. With perceptual
+matching enabled it also stores a 64-bit difference hash, which catches retakes of an unchanged screen
+whose bytes differ slightly (a blinking cursor, a clock).
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+
+INDEX_FILE = os.path.expanduser('~/.config/e-zshot/upload-cache.json')
+LOCK_FILE = INDEX_FILE + '.lock'
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_AGE_DAYS = 30
+# Differing bits out of 64 that still count as the same picture
+NEAR_DUPLICATE_DISTANCE = 3
+
+class _Locked:
+    """Hold an exclusive lock on the index for a read-modify-write."""
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+        self.lock_file = open(LOCK_FILE, 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock_file.close()
+
+def _load() -> dict:
+    try:
+        with open(INDEX_FILE, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault('entries', {})
+    index.setdefault('stats', {})
+    for key in ('hits', 'near_hits', 'misses', 'bytes_saved'):
+        index['stats'].setdefault(key, 0)
+    return index
+
+def _save(index: dict) -> None:
+    tmp_path = INDEX_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, INDEX_FILE)
+
+def _evict(index: dict, max_entries: int, max_age_days: float) -> None:
+    entries = index['entries']
+    cutoff = time.time() - max_age_days * 86400
+    for key in [key for key, entry in entries.items() if entry['created'] < cutoff]:
+        del entries[key]
+
+    if len(entries) > max_entries:
+        by_use = sorted(entries, key=lambda key: entries[key]['last_used'])
+        for key in by_use[:len(entries) - max_entries]:
+            del entries[key]
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def perceptual_hash(data: bytes) -> str:
+    """64-bit difference hash of an encoded image, as hex."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEG can decode straight at 1/8 scale; everything else is reduced before the final resize
+        image.draft('L', (image.width // 8, image.height // 8))
+        image = image.convert('L')
+        factor = max(1, min(image.width // 64, image.height // 64))
+        small = image.reduce(factor).resize((9, 8))
+
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return f"{bits:016x}"
+
+def _distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def lookup(data: bytes, perceptual: bool = False, max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+           force: bool = False):
+    """Return (image_url, hashes) for a cached upload of this image, or (None, hashes) on a miss.
+
+    Uploads older than max_age_days never match, whether or not they have been evicted yet. With force
+    the cache isn't consulted at all; the hashes are still handed back so the new upload replaces the
+    old entry. Either way store() does not have to compute them again.
+    """
+    hashes = {'sha256': content_hash(data)}
+    if perceptual:
+        try:
+            hashes['phash'] = perceptual_hash(data)
+        except Exception as e:
+            logging.debug(f"Perceptual hash failed: {e}")
+    if force:
+        return None, hashes
+
+    cutoff = time.time() - max_age_days * 86400
+    with _Locked():
+        index = _load()
+        entries = index['entries']
+        match = entries.get(hashes['sha256'])
+        if match is not None and match['created'] < cutoff:
+            match = None
+        kind = 'hits'
+        if match is None and 'phash' in hashes:
+            near = [entry for entry in entries.values()
+                    if entry.get('phash') and entry['created'] >= cutoff
+                    and _distance(entry['phash'], hashes['phash']) <= NEAR_DUPLICATE_DISTANCE]
+            match = max(near, key=lambda entry: entry['last_used'], default=None)
+            kind = 'near_hits'
+
+        if match is None:
+            index['stats']['misses'] += 1
+        else:
+            index['stats'][kind] += 1
+            index['stats']['bytes_saved'] += len(data)
+            match['last_used'] = time.time()
+        _save(index)
+
+    if match is not None:
+        logging.debug(f"Upload cache {kind[:-1].replace('_', ' ')}: {match['url']}")
+        return match['url'], hashes
+    return None, hashes
+
+def store(hashes: dict, image_url: str, size: int, max_entries: int = DEFAULT_MAX_ENTRIES,
+          max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> None:
+    now = time.time()
+    with _Locked():
+        index = _load()
+        index['entries'][hashes['sha256']] = {
+            'url': image_url,
+            'phash': hashes.get('phash'),
+            'size': size,
+            'created': now,
+            'last_used': now,
+        }
+        _evict(index, max_entries, max_age_days)
+        _save(index)
+
+def settings_from_config(config: dict) -> dict:
+    def enabled(key, default):
+        value = config.get(key)
+        return default if value in (None, '') else str(value).lower() == 'true'
+
+    return {
+        'enabled': enabled('dedup', True),
+        'perceptual': enabled('dedup_perceptual', False),
+        'max_entries': int(config.get('dedup_max_entries') or DEFAULT_MAX_ENTRIES),
+        'max_age_days': float(config.get('dedup_max_age_days') or DEFAULT_MAX_AGE_DAYS),
+        # Set for --force-upload: upload regardless, but still record the new URL
+        'force': False,
+    }
+
+def format_stats() -> str:
+    index = _load()
+    stats = index['stats']
+    total = stats['hits'] + stats['near_hits'] + stats['misses']
+    rate = (stats['hits'] + stats['near_hits']) / total * 100 if total else 0
+    return (f"Upload cache: {len(index['entries'])} entries\n"
+            f"Lookups: {total}, exact hits {stats['hits']}, near-duplicate hits {stats['near_hits']}, "
+            f"misses {stats['misses']} ({rate:.1f}% hit rate, {stats['bytes_saved'] / 1024:.0f} KiB not uploaded)")
@@ -0,0 +1,236 @@
+"""Shared encode stage: turns captures into the image_type/compression_level from config.json."""
+
+import io
+import logging
+
+FORMATS = {
+    'png': {'pil': 'PNG', 'ext': 'png', 'mime': 'image/png'},
+    'png8': {'pil': 'PNG', 'ext': 'png', 'mime': 'image/png'},  # palette PNG, 256 colours
+    'jpeg': {'pil': 'JPEG', 'ext': 'jpg', 'mime': 'image/jpeg'},
+    'webp': {'pil': 'WEBP', 'ext': 'webp', 'mime': 'image/webp'},  # lossless WebP
+    'gif': {'pil': 'GIF', 'ext': 'gif', 'mime': 'image/gif'},
+}
+ALIASES = {'jpg': 'jpeg', 'palette': 'png8'}
+
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_JPEG_QUALITY = 90
+
+def _int_setting(value, default: int, low: int, high: int) -> int:
+    try:
+        return min(high, max(low, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+def settings_from_config(config: dict) -> dict:
+    """Read the encoder settings written by e-zconfig.sh, falling back to compressed PNG."""
+    image_format = str(config.get('image_type') or 'png').strip().lower()
+    image_format = ALIASES.get(image_format, image_format)
+    if image_format not in FORMATS:
+        logging.warning(f"Unsupported image_type '{image_format}', using PNG.")
+        image_format = 'png'
+
+    return {
+        'format': image_format,
+        'level': _int_setting(config.get('compression_level'), DEFAULT_COMPRESSION_LEVEL, 0, 9),
+        'quality': _int_setting(config.get('jpeg_quality'), DEFAULT_JPEG_QUALITY, 1, 100),
+    }
+
+def mime_type(settings: dict) -> str:
+    return FORMATS[settings['format']]['mime']
+
+def extension(settings: dict) -> str:
+    return FORMATS[settings['format']]['ext']
+
+def filename(settings: dict, stem: str = 'screenshot') -> str:
+    return f"{stem}.{extension(settings)}"
+
+def grim_args(settings: dict):
+    """Arguments that let grim produce the final encoding itself, or None if PIL has to do it."""
+    if settings['format'] == 'png':
+        return ['-t', 'png', '-l', str(settings['level'])]
+    if settings['format'] == 'jpeg':
+        return ['-t', 'jpeg', '-q', str(settings['quality'])]
+    return None
+
+def sniff_format(data: bytes):
+    """Identify an already-encoded buffer by its magic bytes."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        # IHDR colour type 3 is an indexed (palette) PNG
+        return 'png8' if len(data) > 25 and data[25] == 3 else 'png'
+    if data[:2] == b'\xff\xd8':
+        return 'jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:4] == b'GIF8':
+        return 'gif'
+    return None
+
+def encode_image(image, settings: dict) -> bytes:
+    """Encode a PIL image with the configured format and level."""
+    from PIL import Image
+
+    image_format = settings['format']
+    output = io.BytesIO()
+
+    if image_format == 'png':
+        image.save(output, format='PNG', compress_level=settings['level'])
+    elif image_format == 'png8':
+        image.convert('RGB').quantize(256, method=Image.Quantize.FASTOCTREE).save(
+            output, format='PNG', compress_level=settings['level'])
+    elif image_format == 'jpeg':
+        image.convert('RGB').save(output, format='JPEG', quality=settings['quality'])
+    elif image_format == 'webp':
+        # compression_level 0-9 maps onto libwebp's effort setting 0-6
+        image.save(output, format='WEBP', lossless=settings.get('lossless', True), quality=settings['quality'],
+                   method=round(settings['level'] * 6 / 9))
+    elif image_format == 'gif':
+        image.convert('RGB').quantize(256, method=Image.Quantize.FASTOCTREE).save(output, format='GIF')
+
+    return output.getvalue()
+
+def decode(data: bytes):
+    """Decode a capture into a PIL image; raw PPM from grim is little more than a memcpy."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+def ensure_format(data: bytes, settings: dict) -> bytes:
+    """Re-encode a capture only if it is not already in the configured format."""
+    if sniff_format(data) == settings['format']:
+        return data
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        encoded = encode_image(image, settings)
+    logging.debug(f"Encoded capture as {settings['format']}: {len(data)} -> {len(encoded)} bytes")
+    return encoded
+
+def parse_size(value) -> int:
+    """Parse a byte budget such as 500000, "500K" or "2M" (0 means no budget)."""
+    if value in (None, ''):
+        return 0
+    text = str(value).strip().upper().rstrip('B')
+    multiplier = 1
+    if text and text[-1] in 'KMG':
+        multiplier = 1024 ** ('KMG'.index(text[-1]) + 1)
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        logging.warning(f"Ignoring invalid max_upload_size '{value}'.")
+        return 0
+
+def _probe(image):
+    """Mosaic of four corner-to-centre tiles, a quarter of the frame, that keeps native pixel detail."""
+    width, height = image.size
+    tile_w, tile_h = max(1, width // 4), max(1, height // 4)
+    probe = image.crop((0, 0, tile_w * 2, tile_h * 2)).copy()
+    origins = [(width // 8, height // 8), (width * 5 // 8, height // 8),
+               (width // 8, height * 5 // 8), (width * 5 // 8, height * 5 // 8)]
+    for index, (x, y) in enumerate(origins):
+        tile = image.crop((x, y, x + tile_w, y + tile_h))
+        probe.paste(tile, ((index % 2) * tile_w, (index // 2) * tile_h))
+    return probe
+
+def _scaled(image, scale: float):
+    from PIL import Image
+
+    if scale == 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+def budget_candidates(image, probe, settings: dict) -> list:
+    """Encodings to try in place of the configured one, most faithful first: (label, settings, scale)."""
+    from PIL import features
+
+    candidates = []
+    lossless_palette = image.getcolors(256) is not None
+    if lossless_palette and settings['format'] != 'png8':
+        candidates.append(('palette PNG (lossless)', dict(settings, format='png8', level=9), 1))
+
+    if features.check('webp'):
+        candidates.append(('lossless WebP', dict(settings, format='webp', lossless=True, level=9), 1))
+        lossy = [(f"WebP q{quality}", dict(settings, format='webp', lossless=False, quality=quality))
+                 for quality in (90, 75, 60, 45)]
+    else:
+        lossy = [(f"JPEG q{quality}", dict(settings, format='jpeg', quality=quality)) for quality in (90, 75, 60, 45)]
+
+    # Flat UI screenshots with few distinct colours quantize to a palette with little visible loss. It is
+    # the same encode as the lossless palette candidate, so it is only tried when that one wasn't
+    if not lossless_palette and probe.getcolors(4096) is not None and settings['format'] != 'png8':
+        candidates.append(('palette PNG (quantized)', dict(settings, format='png8', level=9), 1))
+
+    candidates.extend((label, candidate, 1) for label, candidate in lossy)
+
+    # Last resort: HiDPI captures usually survive downscaling well
+    label, downscale_settings = lossy[1]
+    for scale in (0.75, 0.5, 0.35):
+        candidates.append((f"{label} at {int(scale * 100)}%", downscale_settings, scale))
+    return candidates
+
+def fit_to_budget(image, settings: dict, budget: int, baseline: bytes = None):
+    """Pick the most faithful encoding whose size fits the byte budget.
+
+    Each candidate is first estimated on a quarter-area probe and only encoded at full size when the
+    estimate fits, so rejected candidates cost a fraction of a full encode. baseline is the capture
+    already encoded in the configured format, if it has been. Nothing larger than it is ever returned.
+    Returns (data, settings) for the encoding that was chosen.
+    """
+    if baseline is None:
+        baseline = encode_image(image, settings)
+    if len(baseline) <= budget:
+        return baseline, settings
+
+    probe = _probe(image)
+    probe_ratio = (image.width * image.height) / max(1, probe.width * probe.height)
+    smallest = (baseline, settings, f"{settings['format']} as configured")
+    skipped = []
+
+    def attempt(label, candidate, scale):
+        nonlocal smallest
+        data = encode_image(_scaled(image, scale), candidate)
+        if len(data) < len(smallest[0]):
+            smallest = (data, candidate, label)
+        if len(data) <= budget:
+            logging.info(f"Budget {budget / 1024:.0f} KiB: chose {label}, {len(data) / 1024:.0f} KiB "
+                         f"instead of {len(baseline) / 1024:.0f} KiB {settings['format']} "
+                         f"(saved {(len(baseline) - len(data)) / 1024:.0f} KiB)")
+            return data
+        logging.debug(f"Budget: {label} came out at {len(data) / 1024:.0f} KiB, over budget")
+        return None
+
+    for label, candidate, scale in budget_candidates(image, probe, settings):
+        estimate = len(encode_image(_scaled(probe, scale), candidate)) * probe_ratio
+        if estimate > budget * 1.1:
+            logging.debug(f"Budget: skipping {label}, estimated {estimate / 1024:.0f} KiB")
+            skipped.append((label, candidate, scale))
+            continue
+        data = attempt(label, candidate, scale)
+        if data is not None:
+            return data, candidate
+
+    # Estimates from the probe can be well off, so before giving up the skipped candidates get a real try
+    for label, candidate, scale in skipped:
+        data = attempt(label, candidate, scale)
+        if data is not None:
+            return data, candidate
+
+    data, candidate, label = smallest
+    logging.warning(f"No encoding fits the {budget / 1024:.0f} KiB budget; using {label} "
+                    f"at {len(data) / 1024:.0f} KiB (was {len(baseline) / 1024:.0f} KiB)")
+    return data, candidate
+
+def fit_bytes_to_budget(data: bytes, settings: dict, budget: int):
+    """Like fit_to_budget() for an already-encoded capture; returns it unchanged if it already fits."""
+    if not budget or len(data) <= budget:
+        return data, settings
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        return fit_to_budget(image, settings, budget, baseline=data)
@@ -0,0 +1,189 @@
+"""Hedged uploads: when a request is slower than recent uploads, race a second one on a new connection.
+
+Every upload's latency is recorded in LATENCY_FILE. With hedging on, an upload that hasn't been answered
+within a percentile of the recent latencies of similar-sized uploads is sent again on a fresh session, so
+a stalled connection or a slow server node costs one percentile's wait instead of a full timeout. The
+first successful response wins. The other request can't be stopped once its body is on the wire, so it is
+abandoned, and settle() checks before exit whether it also succeeded: that means the image now exists
+twice on the server, which is logged and counted.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from . import session
+
+LATENCY_FILE = os.path.expanduser('~/.config/e-zshot/upload-latency.json')
+LOCK_FILE = LATENCY_FILE + '.lock'
+
+HISTORY = 100
+MIN_SAMPLES = 5
+DEFAULT_PERCENTILE = 95
+# Used until enough uploads have been timed
+DEFAULT_DELAY = 2.0
+MIN_DELAY = 0.25
+# Samples count as similar when their size is within this factor of the upload's
+SIZE_FACTOR = 4
+SETTLE_TIMEOUT = 10
+
+_enabled = False
+_percentile = DEFAULT_PERCENTILE
+_losers = []
+
+class _Locked:
+    """Hold an exclusive lock on the latency file for a read-modify-write."""
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+        self.lock_file = open(LOCK_FILE, 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock_file.close()
+
+def _load() -> dict:
+    try:
+        with open(LATENCY_FILE, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault('samples', [])
+    state.setdefault('stats', {})
+    for key in ('hedged', 'hedge_won', 'duplicates'):
+        state['stats'].setdefault(key, 0)
+    return state
+
+def _save(state: dict) -> None:
+    tmp_path = LATENCY_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, LATENCY_FILE)
+
+def _update(change) -> None:
+    try:
+        with _Locked():
+            state = _load()
+            change(state)
+            _save(state)
+    except OSError as e:
+        logging.debug(f"Could not update {LATENCY_FILE}: {e}")
+
+def configure(config: dict, enabled: bool = False) -> None:
+    global _enabled, _percentile
+    _enabled = enabled or str(config.get('hedged_upload')).lower() == 'true'
+    _percentile = float(config.get('hedge_percentile') or DEFAULT_PERCENTILE)
+
+def enabled() -> bool:
+    return _enabled
+
+def record(size: int, seconds: float) -> None:
+    """Remember how long an upload of size bytes took, from sending it to the response."""
+    def add(state):
+        state['samples'].append([size, round(seconds, 4)])
+        del state['samples'][:-HISTORY]
+
+    _update(add)
+
+def _nearest_rank(values: list, percentile: float) -> float:
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(len(values) * percentile / 100 + 0.5) - 1))
+    return values[rank]
+
+def delay(size: int) -> float:
+    """Seconds to wait for the first request before hedging an upload of size bytes."""
+    samples = _load()['samples']
+    similar = [seconds for sample_size, seconds in samples
+               if sample_size * SIZE_FACTOR >= size and sample_size <= size * SIZE_FACTOR]
+    if len(similar) < MIN_SAMPLES:
+        similar = [seconds for _, seconds in samples]
+    if len(similar) < MIN_SAMPLES:
+        return DEFAULT_DELAY
+
+    return max(MIN_DELAY, _nearest_rank(similar, _percentile))
+
+def post(send, size: int):
+    """Run ``send(session) -> response`` and hedge it if it runs long; returns (response, hedged, seconds).
+
+    The winning response is returned as soon as it arrives. If every request fails, the last error is raised.
+    """
+    results = queue.Queue()
+
+    def run(label, http_session):
+        start_time = time.perf_counter()
+        try:
+            response = send(http_session)
+            response.raise_for_status()
+            results.put((label, response, None, time.perf_counter() - start_time))
+        except Exception as e:
+            results.put((label, None, e, time.perf_counter() - start_time))
+
+    threading.Thread(target=run, args=('primary', session.get_session()), daemon=True).start()
+    pending = 1
+    hedged = False
+    wait = delay(size)
+
+    while True:
+        try:
+            label, response, error, seconds = results.get(timeout=None if hedged else wait)
+        except queue.Empty:
+            logging.debug(f"No response after {wait:.2f}s, sending a hedged request on a new connection")
+            threading.Thread(target=run, args=('hedge', session.new_session()), daemon=True).start()
+            pending += 1
+            hedged = True
+            _update(lambda state: state['stats'].update(hedged=state['stats']['hedged'] + 1))
+            continue
+
+        pending -= 1
+        if error is None:
+            break
+        logging.debug(f"{label.capitalize()} request failed: {error}")
+        if pending == 0:
+            # Nothing left in flight, e.g. the primary failed before the hedge was due; the caller retries
+            raise error
+
+    record(size, seconds)
+    if label == 'hedge':
+        _update(lambda state: state['stats'].update(hedge_won=state['stats']['hedge_won'] + 1))
+    logging.debug(f"{label.capitalize()} request won after {seconds:.2f}s")
+    if pending:
+        _losers.append((results, response.json().get('imageUrl')))
+    return response, hedged, seconds
+
+def settle(timeout: float = SETTLE_TIMEOUT) -> None:
+    """Wait for abandoned requests and report any that also uploaded the image."""
+    deadline = time.monotonic() + timeout
+    while _losers:
+        results, winner_url = _losers.pop()
+        try:
+            label, response, error, _ = results.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            logging.debug("Abandoned hedged request still running; it is dropped on exit")
+            continue
+        if error is not None:
+            continue
+
+        try:
+            duplicate_url = response.json().get('imageUrl')
+        except ValueError:
+            duplicate_url = None
+        if duplicate_url and duplicate_url != winner_url:
+            logging.warning(f"The losing {label} request also uploaded the screenshot: {duplicate_url} "
+                            f"duplicates {winner_url}")
+            _update(lambda state: state['stats'].update(duplicates=state['stats']['duplicates'] + 1))
+
+def format_stats() -> str:
+    state = _load()
+    stats = state['stats']
+    samples = [seconds for _, seconds in state['samples']]
+    if not samples:
+        return "Upload latency: no uploads timed yet"
+    return (f"Upload latency over the last {len(samples)} uploads: median {_nearest_rank(samples, 50):.2f}s, "
+            f"p{_percentile:g} {_nearest_rank(samples, _percentile):.2f}s\n"
+            f"Hedged uploads: {stats['hedged']}, won by the hedge {stats['hedge_won']}, "
+            f"duplicates left on the server {stats['duplicates']}")
@@ -0,0 +1,196 @@
+"""Local index of every screenshot taken: where it was saved, where it was uploaded, and a thumbnail.
+
+Entries live in a SQLite database indexed on time and content hash, with an FTS5 trigram index over URL
+and path, so ``--history`` answers from an index instead of walking the screenshot folders, even for text
+in the middle of a URL. Recording runs as its own pipeline stage after the save and upload and is only
+waited for once the URL is out, so neither the thumbnail nor the database write delays it. Thumbnails
+are made from pixels that are already decoded when there are any; otherwise the capture is opened with
+``draft()`` (JPEG decodes straight at 1/2 to 1/8 scale) and shrunk with ``reduce()`` before the final
+resize. Captures that were neither saved nor uploaded aren't recorded, and entries past
+history_max_entries or history_max_age_days are dropped along with their thumbnails.
+"""
+
+import io
+import logging
+import os
+import sqlite3
+import time
+
+from . import dedup
+
+HISTORY_DB = os.path.expanduser('~/.config/e-zshot/history.db')
+THUMBNAIL_DIR = os.path.expanduser('~/.config/e-zshot/thumbnails')
+THUMBNAIL_SIZE = 256
+DEFAULT_LIMIT = 20
+# Older entries, and their thumbnails, are dropped as new ones are recorded
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_AGE_DAYS = 365
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shots (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    plugin TEXT,
+    hash TEXT,
+    path TEXT,
+    url TEXT,
+    width INTEGER,
+    height INTEGER,
+    size INTEGER,
+    format TEXT,
+    thumbnail TEXT
+);
+CREATE INDEX IF NOT EXISTS shots_created ON shots (created);
+CREATE INDEX IF NOT EXISTS shots_hash ON shots (hash);
+"""
+
+# Substring search over url and path; the trigram tokenizer matches text of three characters or more
+TEXT_SCHEMA = """
+BEGIN;
+CREATE VIRTUAL TABLE shots_text USING fts5(url, path, content='shots', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER shots_text_insert AFTER INSERT ON shots BEGIN
+    INSERT INTO shots_text (rowid, url, path) VALUES (new.id, new.url, new.path);
+END;
+CREATE TRIGGER shots_text_delete AFTER DELETE ON shots BEGIN
+    INSERT INTO shots_text (shots_text, rowid, url, path) VALUES ('delete', old.id, old.url, old.path);
+END;
+INSERT INTO shots_text (shots_text) VALUES ('rebuild');
+COMMIT;
+"""
+MIN_MATCH_LENGTH = 3
+
+def enabled(config: dict) -> bool:
+    return str(config.get('history', 'true')).lower() != 'false'
+
+def settings_from_config(config: dict) -> dict:
+    return {
+        'max_entries': int(config.get('history_max_entries') or DEFAULT_MAX_ENTRIES),
+        'max_age_days': float(config.get('history_max_age_days') or DEFAULT_MAX_AGE_DAYS),
+    }
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(HISTORY_DB), exist_ok=True)
+    connection = sqlite3.connect(HISTORY_DB, timeout=10)
+    connection.row_factory = sqlite3.Row
+    # WAL lets a --history query read while another capture is writing
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    if not _has_text_index(connection):
+        try:
+            # Also indexes the rows of a database written before the text index existed
+            connection.executescript(TEXT_SCHEMA)
+        except sqlite3.OperationalError as e:
+            connection.rollback()
+            logging.debug(f"No FTS5 trigram support in this SQLite, searching without an index: {e}")
+    return connection
+
+def _has_text_index(connection: sqlite3.Connection) -> bool:
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'shots_text'").fetchone() is not None
+
+def make_thumbnail(content_hash: str, data: bytes = None, image=None):
+    """Write a WebP thumbnail for the capture and return (path, width, height) of the full image."""
+    from PIL import Image
+
+    if image is None:
+        image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    path = os.path.join(THUMBNAIL_DIR, f"{content_hash[:16]}.webp")
+    if os.path.exists(path):
+        return path, width, height
+
+    # Only JPEG can decode at reduced scale; for everything else draft() does nothing
+    image.draft('RGB', (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+    factor = max(1, min(image.width, image.height) // (THUMBNAIL_SIZE * 2))
+    small = image.reduce(factor) if factor > 1 else image.copy()
+    small.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    if small.mode not in ('RGB', 'RGBA'):
+        small = small.convert('RGBA' if 'A' in small.getbands() else 'RGB')
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    tmp_path = path + '.tmp'
+    small.save(tmp_path, format='WEBP', quality=70, method=0)
+    os.replace(tmp_path, path)
+    return path, width, height
+
+def record(plugin: str, data: bytes = None, image=None, path: str = None, url: str = None,
+           image_format: str = None, settings: dict = None) -> None:
+    """Add a capture to the history. data is the encoded capture; without it, it is read back from path.
+
+    A capture that was neither saved nor uploaded has nothing to look up later and isn't recorded.
+    settings holds the size limits from settings_from_config().
+    """
+    if not path and not url:
+        return
+    settings = settings or settings_from_config({})
+    try:
+        if data is None and path:
+            with open(path, 'rb') as f:
+                data = f.read()
+        content_hash = dedup.content_hash(data) if data else None
+
+        thumbnail, width, height = None, None, None
+        if content_hash:
+            try:
+                thumbnail, width, height = make_thumbnail(content_hash, data, image)
+            except Exception as e:
+                logging.debug(f"Could not make a thumbnail: {e}")
+
+        connection = _connect()
+        with connection:
+            connection.execute(
+                'INSERT INTO shots (created, plugin, hash, path, url, width, height, size, format, thumbnail) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), plugin, content_hash, path and os.path.abspath(path), url, width, height,
+                 len(data) if data else None, image_format, thumbnail))
+            _prune(connection, settings['max_entries'], settings['max_age_days'])
+        connection.close()
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"Could not record the screenshot in the history: {e}")
+
+def _prune(connection: sqlite3.Connection, max_entries: int, max_age_days: float) -> None:
+    """Drop entries past the age or count limit, and the thumbnails no remaining entry uses."""
+    condition = 'created < ? OR id NOT IN (SELECT id FROM shots ORDER BY created DESC LIMIT ?)'
+    limits = (time.time() - max_age_days * 86400, max_entries)
+    thumbnails = {row[0] for row in connection.execute(f'SELECT thumbnail FROM shots WHERE {condition}', limits)
+                  if row[0]}
+    if not connection.execute(f'DELETE FROM shots WHERE {condition}', limits).rowcount:
+        return
+    for thumbnail in thumbnails:
+        if connection.execute('SELECT 1 FROM shots WHERE thumbnail = ?', (thumbnail,)).fetchone() is None:
+            try:
+                os.remove(thumbnail)
+            except OSError:
+                pass
+
+def query(text: str = None, limit: int = DEFAULT_LIMIT) -> list:
+    """Newest entries first: all of them, those whose URL or path contains text, or copies of the file text."""
+    connection = _connect()
+    if text and os.path.isfile(os.path.expanduser(text)):
+        with open(os.path.expanduser(text), 'rb') as f:
+            content_hash = dedup.content_hash(f.read())
+        rows = connection.execute('SELECT * FROM shots WHERE hash = ? ORDER BY created DESC LIMIT ?',
+                                  (content_hash, limit)).fetchall()
+    elif text and len(text) >= MIN_MATCH_LENGTH and _has_text_index(connection):
+        phrase = '"' + text.replace('"', '""') + '"'
+        rows = connection.execute('SELECT * FROM shots WHERE id IN (SELECT rowid FROM shots_text WHERE shots_text MATCH ?) '
+                                  'ORDER BY created DESC LIMIT ?', (phrase, limit)).fetchall()
+    elif text:
+        # Too short for a trigram, or no FTS5: scan
+        pattern = f"%{text}%"
+        rows = connection.execute('SELECT * FROM shots WHERE url LIKE ? OR path LIKE ? ORDER BY created DESC LIMIT ?',
+                                  (pattern, pattern, limit)).fetchall()
+    else:
+        rows = connection.execute('SELECT * FROM shots ORDER BY created DESC LIMIT ?', (limit,)).fetchall()
+    connection.close()
+    return rows
+
+def format_entries(rows: list) -> str:
+    if not rows:
+        return "No screenshots in the history match."
+    lines = []
+    for row in rows:
+        size = f"{row['width']}x{row['height']}" if row['width'] else '?'
+        kib = f"{row['size'] / 1024:.0f} KiB" if row['size'] else ''
+        lines.append(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(row['created']))}  {size:>9}  {kib:>8}  "
+                     f"{row['url'] or '(not uploaded)'}  {row['path'] or ''}".rstrip())
+    return '\n'.join(lines)
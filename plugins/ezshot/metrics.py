@@ -0,0 +1,161 @@
+"""Structured per-stage timings for every capture, and an opt-in profiler (``--profile``).
+
+Each plugin run appends one JSON line to METRICS_FILE with its spans: selection, capture, decode, overlay,
+encode, save, upload, clipboard and notify, each with its start offset, duration, byte count where one
+applies, and the process's peak RSS when the span ended. While profiling, spans also carry the peak of
+Python allocations (from tracemalloc) during the span; when spans overlap on different threads that peak
+covers all of them.
+
+Set ``"metrics": "false"`` in config.json to stop writing the file.
+"""
+
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = os.path.expanduser('~/.config/e-zshot/metrics.jsonl')
+PROFILE_DIR = os.path.expanduser('~/.config/e-zshot/profiles')
+# The file is trimmed to its newest half once it grows past this
+METRICS_FILE_LIMIT = 2 * 1024 * 1024
+
+_lock = threading.Lock()
+_spans = []
+_run_start = time.perf_counter()
+_enabled = True
+_profiles = []
+_profiling = False
+
+def configure(config: dict) -> None:
+    global _enabled
+    _enabled = str(config.get('metrics', 'true')).lower() != 'false'
+
+def _peak_rss_kib() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+@contextmanager
+def span(name: str, **fields):
+    """Time a stage. The yielded dict can be filled in during the span, e.g. ``s['bytes'] = len(data)``."""
+    record = dict(fields)
+    # The profilers are only imported for --profile; without it there is nothing to ask
+    tracemalloc = sys.modules.get('tracemalloc')
+    if tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start_time = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['name'] = name
+        record['start'] = round(start_time - _run_start, 4)
+        record['duration'] = round(time.perf_counter() - start_time, 4)
+        record['peak_rss_kib'] = _peak_rss_kib()
+        if tracemalloc and tracemalloc.is_tracing():
+            record['py_peak_kib'] = tracemalloc.get_traced_memory()[1] // 1024
+        with _lock:
+            _spans.append(record)
+
+def profiled(fn):
+    """Wrap a function that runs on a worker thread so --profile sees it; cProfile is per thread."""
+    if not _profiling:
+        return fn
+
+    import cProfile
+
+    def run(*args, **kwargs):
+        profile = cProfile.Profile()
+        with _lock:
+            _profiles.append(profile)
+        return profile.runcall(fn, *args, **kwargs)
+
+    return run
+
+def _write(line: dict) -> None:
+    os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+    with open(METRICS_FILE, 'a') as f:
+        f.write(json.dumps(line) + '\n')
+
+    if os.path.getsize(METRICS_FILE) > METRICS_FILE_LIMIT:
+        with open(METRICS_FILE, 'r') as f:
+            lines = f.readlines()
+        tmp_path = METRICS_FILE + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(lines[len(lines) // 2:])
+        os.replace(tmp_path, METRICS_FILE)
+
+def _dump_profile(plugin: str, snapshot) -> None:
+    import pstats
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{plugin}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+    stats = pstats.Stats(_profiles[0])
+    for profile in _profiles[1:]:
+        stats.add(profile)
+    stats.dump_stats(stem + '.prof')
+    snapshot.dump(stem + '.tracemalloc')
+
+    summary = io.StringIO()
+    pstats.Stats(stem + '.prof', stream=summary).sort_stats('cumulative').print_stats(15)
+    print(summary.getvalue(), file=sys.stderr)
+    print("Top allocations:", file=sys.stderr)
+    for statistic in snapshot.statistics('lineno')[:10]:
+        print(f"  {statistic}", file=sys.stderr)
+    print(f"Profile written to {stem}.prof (open with `python3 -m pstats` or snakeviz) and "
+          f"{stem}.tracemalloc (tracemalloc.Snapshot.load)", file=sys.stderr)
+
+@contextmanager
+def recording(plugin: str, profile: bool = False):
+    """Collect the spans of one plugin run and write them out when it ends, however it ends."""
+    global _run_start, _profiling
+    with _lock:
+        _spans.clear()
+        _profiles.clear()
+    _run_start = time.perf_counter()
+    started = time.time()
+    exit_code = 0
+
+    if profile:
+        import cProfile
+        import tracemalloc
+
+        _profiling = True
+        tracemalloc.start()
+        main_profile = cProfile.Profile()
+        _profiles.append(main_profile)
+        main_profile.enable()
+
+    try:
+        yield
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+        raise
+    except BaseException:
+        exit_code = 1
+        raise
+    finally:
+        if profile:
+            main_profile.disable()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            _profiling = False
+            _dump_profile(plugin, snapshot)
+
+        if _enabled:
+            with _lock:
+                spans = sorted(_spans, key=lambda record: record['start'])
+            try:
+                _write({
+                    'time': started,
+                    'plugin': plugin,
+                    'exit_code': exit_code,
+                    'total': round(time.perf_counter() - _run_start, 4),
+                    'peak_rss_kib': _peak_rss_kib(),
+                    'spans': spans,
+                })
+            except OSError as e:
+                logging.debug(f"Could not write metrics: {e}")
@@ -0,0 +1,70 @@
+"""Monitor layout as reported by the compositor (sway or Hyprland)."""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+
+def _query(command: list):
+    if not shutil.which(command[0]):
+        return None
+    try:
+        return json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+    except (subprocess.CalledProcessError, ValueError) as e:
+        logging.debug(f"{command[0]} query failed: {e}")
+        return None
+
+def list_outputs() -> list:
+    """Active outputs as dicts with name, x, y, width, height (in layout coordinates), scale and focused.
+
+    Returns an empty list when the compositor can't be asked.
+    """
+    if os.environ.get('SWAYSOCK'):
+        data = _query(['swaymsg', '-t', 'get_outputs', '-r'])
+        if data is not None:
+            return [{
+                'name': output['name'],
+                'x': output['rect']['x'],
+                'y': output['rect']['y'],
+                'width': output['rect']['width'],
+                'height': output['rect']['height'],
+                'scale': output.get('scale') or 1,
+                'focused': bool(output.get('focused')),
+            } for output in data if output.get('active', True)]
+
+    if os.environ.get('HYPRLAND_INSTANCE_SIGNATURE'):
+        data = _query(['hyprctl', '-j', 'monitors'])
+        if data is not None:
+            result = []
+            for monitor in data:
+                scale = monitor.get('scale') or 1
+                # Hyprland reports the mode in physical pixels, before rotation
+                width, height = monitor['width'], monitor['height']
+                if monitor.get('transform', 0) % 2:
+                    width, height = height, width
+                result.append({
+                    'name': monitor['name'],
+                    'x': monitor['x'],
+                    'y': monitor['y'],
+                    'width': round(width / scale),
+                    'height': round(height / scale),
+                    'scale': scale,
+                    'focused': bool(monitor.get('focused')),
+                })
+            return result
+
+    return []
+
+def focused_output():
+    return next((output for output in list_outputs() if output['focused']), None)
+
+def layout_bounds(output_list: list = None):
+    """(left, top, right, bottom) of the whole layout, or None if it isn't known."""
+    output_list = list_outputs() if output_list is None else output_list
+    if not output_list:
+        return None
+    return (min(output['x'] for output in output_list),
+            min(output['y'] for output in output_list),
+            max(output['x'] + output['width'] for output in output_list),
+            max(output['y'] + output['height'] for output in output_list))
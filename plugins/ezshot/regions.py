@@ -0,0 +1,98 @@
+"""Capture regions that don't need the interactive selector: the last one, presets, the focused window.
+
+Geometries use slurp's ``X,Y WxH`` format in layout coordinates, which is what ``grim -g`` takes. The last
+region and the window backend that worked are kept for the login session in $XDG_RUNTIME_DIR, so repeat
+captures skip both the selector and the probing of compositor tools.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+SESSION_CACHE = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                             f"e-zshot-{os.getuid()}-regions.json")
+
+def _load_session() -> dict:
+    try:
+        with open(SESSION_CACHE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _update_session(**values) -> None:
+    cache = _load_session()
+    cache.update(values)
+    tmp_path = f"{SESSION_CACHE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, SESSION_CACHE)
+    except OSError as e:
+        logging.debug(f"Could not update the region cache: {e}")
+
+def format_geometry(x: int, y: int, width: int, height: int) -> str:
+    return f"{x},{y} {width}x{height}"
+
+def remember(geometry: str) -> None:
+    _update_session(last=geometry)
+
+def last():
+    return _load_session().get('last')
+
+def _run(command: list) -> str:
+    return subprocess.run(command, capture_output=True, text=True, check=True).stdout
+
+def _sway_window():
+    def find_focused(node):
+        if node.get('focused'):
+            return node
+        for child in node.get('nodes', []) + node.get('floating_nodes', []):
+            found = find_focused(child)
+            if found:
+                return found
+        return None
+
+    node = find_focused(json.loads(_run(['swaymsg', '-t', 'get_tree', '-r'])))
+    if node is None or node.get('type') not in ('con', 'floating_con'):
+        return None
+    rect = node['rect']
+    return format_geometry(rect['x'], rect['y'], rect['width'], rect['height'])
+
+def _hyprland_window():
+    window = json.loads(_run(['hyprctl', '-j', 'activewindow']))
+    if not window or 'at' not in window:
+        return None
+    return format_geometry(*window['at'], *window['size'])
+
+def _x11_window():
+    values = dict(line.split('=', 1) for line in _run(['xdotool', 'getactivewindow', 'getwindowgeometry', '--shell']).split())
+    return format_geometry(int(values['X']), int(values['Y']), int(values['WIDTH']), int(values['HEIGHT']))
+
+WINDOW_BACKENDS = {
+    'sway': ('swaymsg', 'SWAYSOCK', _sway_window),
+    'hyprland': ('hyprctl', 'HYPRLAND_INSTANCE_SIGNATURE', _hyprland_window),
+    'x11': ('xdotool', 'DISPLAY', _x11_window),
+}
+
+def focused_window():
+    """Geometry of the focused window, or None if no backend could tell."""
+    cached = _load_session().get('window_backend')
+    order = sorted(WINDOW_BACKENDS, key=lambda name: name != cached)
+
+    for name in order:
+        tool, env_var, query = WINDOW_BACKENDS[name]
+        if not os.environ.get(env_var) or not shutil.which(tool):
+            continue
+        try:
+            geometry = query()
+        except (subprocess.CalledProcessError, ValueError, KeyError, TypeError) as e:
+            logging.debug(f"Focused window lookup through {tool} failed: {e}")
+            continue
+        if geometry:
+            if name != cached:
+                _update_session(window_backend=name)
+            return geometry
+    return None
@@ -0,0 +1,52 @@
+"""A pooled keep-alive HTTP session whose connection can be opened while the user is still selecting."""
+
+import logging
+import threading
+import time
+
+POOL_SIZE = 8
+
+_session = None
+_warm_thread = None
+
+def get_session():
+    """The shared requests session; module-level so a resident daemon keeps it between captures."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+    return _session
+
+def _warm(url: str) -> None:
+    start_time = time.perf_counter()
+    try:
+        # Any response will do: the point is the DNS lookup, TCP and TLS handshakes, after
+        # which the connection goes back to the pool for the upload to reuse
+        get_session().head(url, timeout=5).close()
+        logging.debug(f"Connection to {url} warmed in {time.perf_counter() - start_time:.2f}s")
+    except Exception as e:
+        logging.debug(f"Connection warm-up failed: {e}")
+
+def prewarm(url: str) -> None:
+    """Open a connection to the upload host in the background."""
+    global _warm_thread
+    if _warm_thread is not None and _warm_thread.is_alive():
+        return
+    _warm_thread = threading.Thread(target=_warm, args=(url,), daemon=True)
+    _warm_thread.start()
+
+def wait_until_warm(timeout: float = 5) -> None:
+    """Let a warm-up that is still handshaking finish rather than opening a second connection."""
+    if _warm_thread is not None:
+        _warm_thread.join(timeout)
+
+def new_session():
+    """A separate session with its own pool, for a request that must not share a connection with the others."""
+    import requests
+
+    return requests.Session()
@@ -0,0 +1,256 @@
+"""On-disk upload queue: captures are spooled here and uploaded by a background worker.
+
+Each entry is a pair of files in SPOOL_DIR, ``<id>.img`` with the encoded image and ``<id>.json`` with
+its metadata. The metadata is renamed into place last, so an entry only becomes visible once the image
+is fully written and a crash can never leave a half-written upload in the queue.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SPOOL_DIR = os.path.expanduser('~/.config/e-zshot/spool')
+FAILED_DIR = os.path.join(SPOOL_DIR, 'failed')
+COMPLETED_LOG = os.path.join(SPOOL_DIR, 'completed.jsonl')
+WORKER_LOCK = os.path.join(SPOOL_DIR, 'worker.lock')
+COMPLETED_LOCK = COMPLETED_LOG + '.lock'
+
+BASE_BACKOFF = 5
+MAX_BACKOFF = 30 * 60
+COMPLETED_LOG_LIMIT = 1000
+
+# Worker threads append to the completed log while one of them may be trimming it
+_completed_lock = threading.Lock()
+
+class PermanentError(Exception):
+    """Raised by an upload function when retrying cannot help (e.g. the API key was rejected)."""
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _write_meta(entry: dict, directory: str = SPOOL_DIR) -> None:
+    _write_atomic(os.path.join(directory, f"{entry['id']}.json"), json.dumps(entry).encode())
+
+def enqueue(data: bytes, filename: str, mime_type: str, extra: dict = None) -> dict:
+    """Persist an encoded capture for the background worker and return its queue entry."""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    entry_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+    entry = {
+        'id': entry_id,
+        'created': time.time(),
+        'filename': filename,
+        'mime_type': mime_type,
+        'size': len(data),
+        'attempts': 0,
+        'next_attempt': 0,
+        'last_error': None,
+    }
+    entry.update(extra or {})
+
+    _write_atomic(os.path.join(SPOOL_DIR, f"{entry_id}.img"), data)
+    _write_meta(entry)
+    return entry
+
+def _read_entries(directory: str) -> list:
+    entries = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return entries
+
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r') as f:
+                entries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(entries, key=lambda entry: entry['created'])
+
+def pending() -> list:
+    return _read_entries(SPOOL_DIR)
+
+def failed() -> list:
+    return _read_entries(FAILED_DIR)
+
+def _remove_entry(entry: dict, directory: str = SPOOL_DIR) -> None:
+    for suffix in ('.json', '.img'):
+        try:
+            os.remove(os.path.join(directory, entry['id'] + suffix))
+        except FileNotFoundError:
+            pass
+
+def _record_completed(record: dict) -> None:
+    # The thread lock covers this process's workers, the file lock any other process draining the queue
+    with _completed_lock, open(COMPLETED_LOCK, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        with open(COMPLETED_LOG, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        # Keep the log bounded; it only feeds the throughput numbers in status()
+        if os.path.getsize(COMPLETED_LOG) > COMPLETED_LOG_LIMIT * 256:
+            records = completed()
+            _write_atomic(COMPLETED_LOG,
+                          ''.join(json.dumps(r) + '\n' for r in records[-COMPLETED_LOG_LIMIT // 2:]).encode())
+
+def completed() -> list:
+    records = []
+    try:
+        with open(COMPLETED_LOG, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+def _process(entry: dict, upload, on_uploaded) -> None:
+    """Upload one entry; on failure reschedule it with exponential backoff."""
+    try:
+        with open(os.path.join(SPOOL_DIR, entry['id'] + '.img'), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        _remove_entry(entry)
+        return
+
+    start_time = time.time()
+    try:
+        url = upload(data, entry)
+    except PermanentError as e:
+        logging.error(f"Giving up on {entry['id']}: {e}")
+        entry['last_error'] = str(e)
+        os.makedirs(FAILED_DIR, exist_ok=True)
+        os.replace(os.path.join(SPOOL_DIR, entry['id'] + '.img'), os.path.join(FAILED_DIR, entry['id'] + '.img'))
+        _write_meta(entry, FAILED_DIR)
+        _remove_entry(entry)
+        return
+    except Exception as e:
+        entry['attempts'] += 1
+        entry['last_error'] = str(e)
+        delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (entry['attempts'] - 1))
+        entry['next_attempt'] = time.time() + delay + random.uniform(0, delay / 4)
+        logging.warning(f"Upload of {entry['id']} failed (attempt {entry['attempts']}), retrying in {delay}s: {e}")
+        _write_meta(entry)
+        return
+
+    finished = time.time()
+    _remove_entry(entry)
+    _record_completed({
+        'id': entry['id'],
+        'created': entry['created'],
+        'uploaded': finished,
+        'duration': finished - start_time,
+        'size': entry['size'],
+        'attempts': entry['attempts'] + 1,
+        'url': url,
+    })
+    on_uploaded(url, entry)
+
+def _acquire_worker_lock():
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    lock_file = open(WORKER_LOCK, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def drain(upload, on_uploaded, concurrency: int = 2) -> bool:
+    """Upload everything in the spool, then return. Returns False if another worker already holds the queue.
+
+    ``upload(data, entry)`` returns the image URL or raises; ``on_uploaded(url, entry)`` runs after each
+    success. Entries that are backing off are waited for, so the worker only exits once the queue is empty.
+    """
+    while True:
+        lock_file = _acquire_worker_lock()
+        if lock_file is None:
+            return False
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                in_flight = {}
+                while True:
+                    entries = [entry for entry in pending() if entry['id'] not in in_flight]
+                    if not entries and not in_flight:
+                        break
+
+                    now = time.time()
+                    for entry in entries:
+                        if len(in_flight) >= concurrency:
+                            break
+                        if entry['next_attempt'] <= now:
+                            in_flight[entry['id']] = pool.submit(_process, entry, upload, on_uploaded)
+
+                    waiting = [entry['next_attempt'] - now for entry in entries if entry['id'] not in in_flight]
+                    # Wake up for the next retry, or at least once a minute to pick up new captures
+                    timeout = max(0.5, min(waiting + [60]))
+                    if in_flight:
+                        done, _ = wait(list(in_flight.values()), timeout=timeout, return_when=FIRST_COMPLETED)
+                        for entry_id in [key for key, future in in_flight.items() if future in done]:
+                            in_flight.pop(entry_id).result()
+                    else:
+                        time.sleep(timeout)
+        finally:
+            lock_file.close()
+
+        # A capture may have been queued after our last scan while its own worker saw the lock held
+        if not pending():
+            return True
+
+def status() -> dict:
+    """Queue depth, age and recent throughput for the CLI."""
+    now = time.time()
+    entries = pending()
+    recent = [record for record in completed() if now - record['uploaded'] <= 3600]
+    upload_time = sum(record.get('duration', 0) for record in recent)
+
+    return {
+        'depth': len(entries),
+        'bytes': sum(entry['size'] for entry in entries),
+        'oldest_age': now - entries[0]['created'] if entries else 0,
+        'retrying': sum(1 for entry in entries if entry['attempts']),
+        'last_error': next((entry['last_error'] for entry in reversed(entries) if entry['last_error']), None),
+        'failed': len(failed()),
+        'uploaded_last_hour': len(recent),
+        'bytes_last_hour': sum(record['size'] for record in recent),
+        'throughput': sum(record['size'] for record in recent) / upload_time if upload_time else 0,
+        'average_wait': (sum(record['uploaded'] - record['created'] for record in recent) / len(recent)
+                         if recent else 0),
+        'worker_running': _worker_running(),
+    }
+
+def _worker_running() -> bool:
+    lock_file = _acquire_worker_lock()
+    if lock_file is None:
+        return True
+    lock_file.close()
+    return False
+
+def format_status(stats: dict) -> str:
+    lines = [
+        f"Queued uploads: {stats['depth']} ({stats['bytes'] / 1024:.0f} KiB)"
+        + (f", oldest {stats['oldest_age']:.0f}s old" if stats['depth'] else ''),
+        f"Worker: {'running' if stats['worker_running'] else 'idle'}",
+    ]
+    if stats['retrying']:
+        lines.append(f"Retrying: {stats['retrying']} (last error: {stats['last_error']})")
+    if stats['failed']:
+        lines.append(f"Failed permanently: {stats['failed']} (see {FAILED_DIR})")
+    lines.append(f"Last hour: {stats['uploaded_last_hour']} uploads, {stats['bytes_last_hour'] / 1024:.0f} KiB, "
+                 f"{stats['throughput'] / 1024:.0f} KiB/s, average wait {stats['average_wait']:.1f}s")
+    return '\n'.join(lines)
@@ -0,0 +1,52 @@
+"""A small scheduler for post-capture steps: each stage starts as soon as the stages it needs are done."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+class Pipeline:
+    """Run named stages concurrently, respecting declared dependencies.
+
+    ``add('clipboard', copy, after=['upload'])`` calls ``copy(url)`` with the upload stage's return value
+    once it is available. Stages without dependencies start immediately. Exceptions, including the
+    SystemExit raised by the plugins' error paths, are re-raised from ``wait()``.
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage')
+        self.futures = {}
+        self.timings = {}
+
+    def add(self, name: str, fn, after=()):
+        dependencies = [self.futures[dependency] for dependency in after]
+
+        def run():
+            results = [future.result() for future in dependencies]
+            start_time = time.perf_counter()
+            try:
+                return metrics.profiled(fn)(*results)
+            finally:
+                self.timings[name] = time.perf_counter() - start_time
+
+        self.futures[name] = self.pool.submit(run)
+        return self.futures[name]
+
+    def result(self, name: str):
+        return self.futures[name].result()
+
+    def wait(self, names=None) -> dict:
+        """Wait for every stage and return their results by name.
+
+        With ``names``, only those stages are waited for and the rest keep running; a later ``wait()``
+        without names collects them and shuts the pool down.
+        """
+        if names is not None:
+            return {name: self.futures[name].result() for name in names}
+        try:
+            results = {name: future.result() for name, future in self.futures.items()}
+        finally:
+            self.pool.shutdown(wait=True)
+        logging.debug("Stage timings: " + ', '.join(f"{name} {elapsed:.3f}s" for name, elapsed in self.timings.items()))
+        return results
@@ -0,0 +1,49 @@
+"""Time-to-first-capture reporting for the plugins (``--startup-report``)."""
+
+import os
+import sys
+import time
+
+# Modules that are expensive to import and should only load on the paths that need them
+HEAVY_MODULES = ['requests', 'PIL.Image', 'PIL.ImageDraw', 'PIL.ImageFont']
+
+_marks = []
+
+def begin() -> None:
+    """Start a new timeline; called at the top of a plugin's main()."""
+    _marks.clear()
+    mark('main')
+
+def mark(label: str) -> None:
+    _marks.append((label, time.perf_counter()))
+
+def process_age():
+    """Seconds since this interpreter process was started, or None if /proc is unavailable."""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+def report(stream=None) -> None:
+    stream = stream or sys.stderr
+    if not _marks:
+        return
+
+    now = time.perf_counter()
+    age = process_age()
+    origin = now - age if age is not None else _marks[0][1]
+
+    print("Startup report (ms since interpreter start):", file=stream)
+    previous = origin
+    for label, timestamp in _marks:
+        print(f"  {label:<24} {(timestamp - origin) * 1000:9.1f}  (+{(timestamp - previous) * 1000:.1f})",
+              file=stream)
+        previous = timestamp
+
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"  heavy modules loaded: {', '.join(loaded) or 'none'}", file=stream)
+    print("  (run with `python3 -X importtime` for a per-module breakdown)", file=stream)
@@ -0,0 +1,77 @@
+"""Streaming multipart uploads, so the network transfer overlaps with capture and encoding."""
+
+import shutil
+import tempfile
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+# Past this the retry copy of the capture rolls over from memory to a temporary file
+SPOOL_MEMORY_LIMIT = 1024 * 1024
+
+class StreamedCapture:
+    """An encoder's output read from a pipe exactly once.
+
+    Every chunk is also written to a spool, so a failed upload can be retried and the capture saved
+    to disk without keeping the whole image in memory. ``check`` runs when the pipe hits EOF and
+    should raise if the producer failed, which aborts an in-flight upload before the body completes.
+    """
+
+    def __init__(self, source, check=None, expected_size: int = 0):
+        self.source = source
+        self.check = check
+        # Upper bound on the final size, for sizing the upload timeout before the size is known
+        self.expected_size = expected_size
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+        self.size = 0
+        self.complete = False
+
+    def chunks(self):
+        """Yield the capture from the start: replay what was already read, then keep reading the pipe."""
+        self.spool.seek(0)
+        while True:
+            chunk = self.spool.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+        read = getattr(self.source, 'read1', self.source.read)
+        while not self.complete:
+            chunk = read(CHUNK_SIZE)
+            if not chunk:
+                self.complete = True
+                if self.check:
+                    self.check()
+                break
+            self.spool.write(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+    def finish(self) -> None:
+        """Read whatever is left in the pipe."""
+        for _ in self.chunks():
+            pass
+
+    def copy_to(self, path: str) -> None:
+        self.finish()
+        self.spool.seek(0)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(self.spool, f)
+
+    def close(self) -> None:
+        self.spool.close()
+
+def multipart_body(capture: StreamedCapture, filename: str, mime_type: str, boundary: str):
+    """A multipart/form-data body with a single 'file' field, generated chunk by chunk."""
+    yield (f'--{boundary}\r\n'
+           f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+           f'Content-Type: {mime_type}\r\n\r\n').encode()
+    yield from capture.chunks()
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+def post_capture(session, url: str, headers: dict, capture: StreamedCapture, filename: str, mime_type: str,
+                 timeout):
+    """POST a streamed capture with chunked transfer encoding, the same form requests' files= builds."""
+    boundary = uuid.uuid4().hex
+    headers = dict(headers, **{'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    return session.post(url, headers=headers, data=multipart_body(capture, filename, mime_type, boundary),
+                        timeout=timeout)
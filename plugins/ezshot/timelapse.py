@@ -0,0 +1,101 @@
+"""Capture every N seconds and only keep frames where enough of the screen changed.
+
+Frames are compared on a small greyscale copy, so the diff costs a few milliseconds even at 4K. Captures
+are scheduled against fixed target times rather than sleeping a fixed interval after each one, so slow
+frames don't push every later frame back, and encoding/uploading happens on a worker thread so it
+doesn't delay the next capture either.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Frames are compared at roughly this width
+DIFF_WIDTH = 320
+# How much a downsampled pixel must change (0-255) to count as changed
+PIXEL_THRESHOLD = 16
+
+def downsample(image):
+    small = image.convert('L')
+    factor = max(1, small.width // DIFF_WIDTH)
+    return small.reduce(factor) if factor > 1 else small
+
+def changed_fraction(previous, current) -> float:
+    """Fraction of the downsampled pixels that differ noticeably between two frames."""
+    from PIL import ImageChops
+
+    if previous is None or previous.size != current.size:
+        return 1.0
+    mask = ImageChops.difference(previous, current).point(lambda value: 255 if value > PIXEL_THRESHOLD else 0)
+    changed = mask.histogram()[255]
+    return changed / (mask.width * mask.height)
+
+def run(capture, handle, interval: float, count: int = 0, threshold: float = 0.005) -> list:
+    """Capture ``count`` frames (0 for until interrupted) every ``interval`` seconds.
+
+    ``capture()`` returns a PIL image; ``handle(image, index)`` encodes and uploads it and returns a URL.
+    Returns one record per frame, in order.
+    """
+    frames = []
+    pending = []
+    previous = None
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='timelapse') as pool:
+        try:
+            index = 0
+            while not count or index < count:
+                target = start + index * interval
+                delay = target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                began = time.monotonic()
+                image = capture()
+                small = downsample(image)
+                changed = changed_fraction(previous, small)
+                record = {
+                    'frame': index,
+                    'time': datetime.now().isoformat(timespec='seconds'),
+                    'drift': began - target,
+                    'changed': changed,
+                    'capture_time': time.monotonic() - began,
+                    'url': None,
+                }
+                frames.append(record)
+
+                if changed >= threshold:
+                    previous = small
+
+                    def process(image=image, index=index, record=record):
+                        process_start = time.monotonic()
+                        record['url'] = handle(image, index)
+                        record['process_time'] = time.monotonic() - process_start
+
+                    pending.append(pool.submit(process))
+                else:
+                    logging.debug(f"Frame {index}: {changed:.2%} changed, skipped")
+                index += 1
+        except KeyboardInterrupt:
+            logging.info("Timelapse interrupted, finishing the frames already captured.")
+
+        for future in pending:
+            future.result()
+    return frames
+
+def format_report(frames: list, interval: float) -> str:
+    lines = [f"{record['time']}  {record['url']}" for record in frames if record['url']]
+    kept = [record for record in frames if 'process_time' in record]
+    drift = [abs(record['drift']) for record in frames]
+    capture_time = [record['capture_time'] for record in frames]
+    lines.append(
+        f"{len(frames)} frames at {interval:g}s, {len(kept)} kept, {len(frames) - len(kept)} unchanged and skipped")
+    if frames:
+        lines.append(f"Drift: average {sum(drift) / len(drift) * 1000:.0f} ms, worst {max(drift) * 1000:.0f} ms; "
+                     f"capture and diff: average {sum(capture_time) / len(capture_time) * 1000:.0f} ms per frame")
+    if kept:
+        process_time = [record['process_time'] for record in kept]
+        lines.append(f"Encode and upload: average {sum(process_time) / len(process_time) * 1000:.0f} ms, "
+                     f"worst {max(process_time) * 1000:.0f} ms per kept frame")
+    return '\n'.join(lines)
@@ -0,0 +1,28 @@
+"""Run the ezshot package against a throwaway HOME and runtime directory.
+
+The modules resolve their state files (~/.config/e-zshot/...) when they are imported, so the environment
+is set up here, before any test imports them, and the state is wiped after every test.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+_root = tempfile.mkdtemp(prefix='ezshot-tests-')
+os.environ['HOME'] = os.path.join(_root, 'home')
+os.environ['XDG_RUNTIME_DIR'] = os.path.join(_root, 'run')
+os.makedirs(os.environ['XDG_RUNTIME_DIR'])
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plugins'))
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    shutil.rmtree(os.environ['HOME'], ignore_errors=True)
+    for name in os.listdir(os.environ['XDG_RUNTIME_DIR']):
+        os.remove(os.path.join(os.environ['XDG_RUNTIME_DIR'], name))
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_root, ignore_errors=True)
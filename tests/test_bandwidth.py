@@ -0,0 +1,45 @@
+import pytest
+
+from ezshot import bandwidth
+
+MiB = 1024 * 1024
+
+def test_first_sample_sets_the_estimate():
+    bandwidth.record(MiB, 2.5)
+    estimate = bandwidth._load()
+    # The default overhead (0.5s) is taken off before the throughput is worked out
+    assert estimate['throughput'] == pytest.approx(MiB / 2.0)
+    assert estimate['overhead'] == pytest.approx(0.5)
+    assert estimate['samples'] == 1
+
+def test_later_samples_are_averaged_with_alpha():
+    bandwidth.record(MiB, 2.5)
+    bandwidth.record(MiB, 1.5)
+    old, new = MiB / 2.0, MiB / 1.0
+    assert bandwidth._load()['throughput'] == pytest.approx(old + bandwidth.ALPHA * (new - old))
+
+def test_small_uploads_only_update_the_overhead():
+    bandwidth.record(1024, 0.2)
+    estimate = bandwidth._load()
+    assert estimate['throughput'] is None
+    assert estimate['samples'] == 0
+    assert estimate['overhead'] == pytest.approx(0.2 - 1024 / bandwidth.DEFAULT_THROUGHPUT)
+
+def test_timeout_scales_with_size_and_attempt():
+    expected = bandwidth.DEFAULT_OVERHEAD + MiB / bandwidth.DEFAULT_THROUGHPUT
+    first = bandwidth.timeout(MiB)
+    assert first == pytest.approx(bandwidth.MIN_TIMEOUT + bandwidth.SAFETY_FACTOR * expected)
+    assert bandwidth.timeout(MiB, attempt=1) == pytest.approx(2 * first)
+    assert bandwidth.timeout(100 * 1024 * MiB) == bandwidth.MAX_TIMEOUT
+
+def test_link_budget_waits_for_enough_samples():
+    for _ in range(bandwidth.MIN_SAMPLES - 1):
+        bandwidth.record(MiB, 4.5)
+    assert bandwidth.link_budget({}) == 0
+    assert bandwidth.effective_budget(5 * MiB, {}) == 5 * MiB
+
+    bandwidth.record(MiB, 4.5)
+    slow = bandwidth.link_budget({})
+    assert 0 < slow < 5 * MiB
+    assert bandwidth.effective_budget(5 * MiB, {}) == slow
+    assert bandwidth.link_budget({'slow_link_seconds': '0'}) == 0
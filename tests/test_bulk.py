@@ -0,0 +1,71 @@
+import json
+import os
+
+from PIL import Image
+
+from ezshot import bulk
+
+def make_images(directory, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"{index}.png")
+        Image.new('RGB', (8 + index, 8), (index * 40, 0, 0)).save(path)
+        paths.append(path)
+    return paths
+
+class Uploader:
+    def __init__(self):
+        self.names = []
+
+    def __call__(self, data, filename, mime_type):
+        self.names.append(filename)
+        return f"https://i.e-z.host/{filename}"
+
+def test_expand_finds_images_under_directories_and_drops_duplicates(tmp_path):
+    paths = make_images(str(tmp_path), 2)
+    (tmp_path / 'notes.txt').write_text('not an image')
+    assert bulk.expand([str(tmp_path), paths[0], str(tmp_path / '*.png')]) == sorted(paths)
+
+def test_run_records_every_upload_in_the_manifest(tmp_path):
+    paths = make_images(str(tmp_path), 3)
+    manifest = str(tmp_path / 'manifest.jsonl')
+
+    summary = bulk.run(paths, Uploader(), manifest, concurrency=2)
+    assert (summary['uploaded'], summary['skipped'], summary['failed'], summary['interrupted']) == (3, 0, [], False)
+    with open(manifest) as f:
+        records = [json.loads(line) for line in f]
+    assert {record['path']: record['url'] for record in records} == {
+        path: f"https://i.e-z.host/{os.path.basename(path)}" for path in paths}
+
+def test_rerun_resumes_from_the_manifest(tmp_path):
+    paths = make_images(str(tmp_path), 3)
+    manifest = str(tmp_path / 'manifest.jsonl')
+    bulk.run(paths[:2], Uploader(), manifest)
+
+    upload = Uploader()
+    summary = bulk.run(paths, upload, manifest)
+    assert upload.names == ['2.png']
+    assert (summary['uploaded'], summary['skipped']) == (1, 2)
+
+def test_changed_file_is_uploaded_again(tmp_path):
+    [path] = make_images(str(tmp_path), 1)
+    manifest = str(tmp_path / 'manifest.jsonl')
+    bulk.run([path], Uploader(), manifest)
+
+    Image.new('RGB', (20, 20), (0, 255, 0)).save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    upload = Uploader()
+    bulk.run([path], upload, manifest)
+    assert upload.names == ['0.png']
+
+def test_non_images_fail_without_retrying_or_entering_the_manifest(tmp_path):
+    path = tmp_path / 'fake.png'
+    path.write_bytes(b'plain text')
+    manifest = str(tmp_path / 'manifest.jsonl')
+
+    upload = Uploader()
+    summary = bulk.run([str(path)], upload, manifest)
+    assert summary['failed'] == [str(path)]
+    assert upload.names == []
+    assert bulk.load_manifest(manifest) == {}
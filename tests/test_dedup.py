@@ -0,0 +1,57 @@
+import json
+import time
+
+from ezshot import dedup
+
+def age_entries(days):
+    with open(dedup.INDEX_FILE) as f:
+        index = json.load(f)
+    for entry in index['entries'].values():
+        entry['created'] -= days * 86400
+    with open(dedup.INDEX_FILE, 'w') as f:
+        json.dump(index, f)
+
+def test_lookup_misses_then_hits_after_store():
+    url, hashes = dedup.lookup(b'capture')
+    assert url is None
+    assert hashes == {'sha256': dedup.content_hash(b'capture')}
+
+    dedup.store(hashes, 'https://i.e-z.host/a.png', 7)
+    url, _ = dedup.lookup(b'capture')
+    assert url == 'https://i.e-z.host/a.png'
+
+    stats = dedup._load()['stats']
+    assert (stats['hits'], stats['misses'], stats['bytes_saved']) == (1, 1, 7)
+
+def test_lookup_ignores_entries_past_the_age_limit():
+    _, hashes = dedup.lookup(b'capture')
+    dedup.store(hashes, 'https://i.e-z.host/a.png', 7)
+    age_entries(10)
+
+    assert dedup.lookup(b'capture', max_age_days=5)[0] is None
+    assert dedup.lookup(b'capture', max_age_days=30)[0] == 'https://i.e-z.host/a.png'
+
+def test_forced_lookup_skips_the_cache_but_returns_hashes():
+    _, hashes = dedup.lookup(b'capture')
+    dedup.store(hashes, 'https://i.e-z.host/old.png', 7)
+
+    url, forced_hashes = dedup.lookup(b'capture', force=True)
+    assert url is None
+    assert forced_hashes == hashes
+    dedup.store(forced_hashes, 'https://i.e-z.host/new.png', 7)
+    assert dedup.lookup(b'capture')[0] == 'https://i.e-z.host/new.png'
+
+def test_evict_drops_old_entries_then_the_least_recently_used():
+    now = time.time()
+    index = {'entries': {
+        'old': {'created': now - 40 * 86400, 'last_used': now},
+        'a': {'created': now, 'last_used': now - 30},
+        'b': {'created': now, 'last_used': now - 20},
+        'c': {'created': now, 'last_used': now - 10},
+    }}
+    dedup._evict(index, max_entries=2, max_age_days=30)
+    assert sorted(index['entries']) == ['b', 'c']
+
+def test_distance_counts_differing_bits():
+    assert dedup._distance('00000000000000ff', '0000000000000000') == 8
+    assert dedup._distance('ffffffffffffffff', 'ffffffffffffffff') == 0
@@ -0,0 +1,63 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from ezshot import encode
+
+def noisy(width=256, height=256, seed=1):
+    rng = random.Random(seed)
+    return Image.frombytes('RGB', (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * 3)))
+
+def encoded(image, image_format, **kwargs):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **kwargs)
+    return output.getvalue()
+
+def test_sniff_format_recognises_each_format():
+    image = Image.new('RGB', (32, 32), (200, 30, 30))
+    assert encode.sniff_format(encoded(image, 'PNG')) == 'png'
+    assert encode.sniff_format(encoded(image.convert('P'), 'PNG')) == 'png8'
+    assert encode.sniff_format(encoded(image, 'JPEG')) == 'jpeg'
+    assert encode.sniff_format(encoded(image, 'WEBP')) == 'webp'
+    assert encode.sniff_format(encoded(image, 'GIF')) == 'gif'
+
+@pytest.mark.parametrize('data', [b'', b'not an image', b'RIFF\0\0\0\0WAVE'])
+def test_sniff_format_rejects_other_data(data):
+    assert encode.sniff_format(data) is None
+
+@pytest.mark.parametrize('value, expected', [
+    (None, 0), ('', 0), (500000, 500000), ('500K', 500 * 1024), ('2M', 2 * 1024 ** 2), ('1.5mb', 3 * 1024 ** 2 // 2),
+    ('lots', 0),
+])
+def test_parse_size(value, expected):
+    assert encode.parse_size(value) == expected
+
+def test_fit_to_budget_keeps_a_capture_that_already_fits():
+    image = Image.new('RGB', (64, 64), (10, 20, 30))
+    settings = encode.settings_from_config({})
+    data, chosen = encode.fit_to_budget(image, settings, 1024 ** 2)
+    assert chosen == settings
+    assert encode.sniff_format(data) == 'png'
+
+def test_fit_to_budget_finds_a_smaller_encoding():
+    image = noisy()
+    settings = encode.settings_from_config({})
+    baseline = encode.encode_image(image, settings)
+    budget = len(baseline) // 3
+    data, chosen = encode.fit_to_budget(image, settings, budget, baseline=baseline)
+    assert len(data) <= budget
+    assert encode.sniff_format(data) == chosen['format']
+
+def test_fit_to_budget_never_returns_more_than_the_original():
+    image = noisy(seed=2)
+    settings = encode.settings_from_config({})
+    baseline = encode.encode_image(image, settings)
+    data, _ = encode.fit_to_budget(image, settings, 1, baseline=baseline)
+    assert len(data) <= len(baseline)
+
+def test_fit_bytes_to_budget_leaves_data_alone_without_a_budget():
+    data = encoded(noisy(64, 64), 'PNG')
+    settings = {'format': 'png'}
+    assert encode.fit_bytes_to_budget(data, settings, 0) == (data, settings)
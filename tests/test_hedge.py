@@ -0,0 +1,43 @@
+import pytest
+
+from ezshot import hedge
+
+@pytest.fixture(autouse=True)
+def configured():
+    hedge.configure({})
+
+def test_nearest_rank():
+    values = list(range(100, 0, -1))
+    assert hedge._nearest_rank(values, 95) == 95
+    assert hedge._nearest_rank(values, 50) == 50
+    assert hedge._nearest_rank(values, 100) == 100
+    assert hedge._nearest_rank([3.0], 95) == 3.0
+
+def test_delay_uses_the_default_until_there_are_enough_samples():
+    for _ in range(hedge.MIN_SAMPLES - 1):
+        hedge.record(100_000, 0.5)
+    assert hedge.delay(100_000) == hedge.DEFAULT_DELAY
+
+def test_delay_is_the_percentile_of_similar_uploads():
+    for seconds in range(1, 21):
+        hedge.record(100_000, seconds / 10)
+    # Much larger uploads aren't similar and don't move the percentile
+    for _ in range(10):
+        hedge.record(100_000 * hedge.SIZE_FACTOR * 2, 30.0)
+    assert hedge.delay(100_000) == pytest.approx(1.9)
+
+def test_delay_falls_back_to_all_samples_and_has_a_floor():
+    for _ in range(hedge.MIN_SAMPLES):
+        hedge.record(1000, 0.01)
+    assert hedge.delay(10_000_000) == hedge.MIN_DELAY
+
+def test_percentile_comes_from_the_config():
+    hedge.configure({'hedge_percentile': '50'})
+    for seconds in range(1, 11):
+        hedge.record(100_000, float(seconds))
+    assert hedge.delay(100_000) == 5.0
+
+def test_history_is_bounded():
+    for _ in range(hedge.HISTORY + 10):
+        hedge.record(1000, 0.1)
+    assert len(hedge._load()['samples']) == hedge.HISTORY
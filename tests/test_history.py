@@ -0,0 +1,88 @@
+import io
+import os
+import sqlite3
+
+import pytest
+from PIL import Image
+
+from ezshot import history
+
+def png(color):
+    output = io.BytesIO()
+    Image.new('RGB', (600, 400), color).save(output, format='PNG')
+    return output.getvalue()
+
+def urls(rows):
+    return [row['url'] for row in rows]
+
+def test_schema_has_the_indexes():
+    connection = history._connect()
+    names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+    connection.close()
+    assert {'shots', 'shots_created', 'shots_hash'} <= names
+
+def test_capture_that_was_neither_saved_nor_uploaded_is_not_recorded():
+    history.record('e-z-grim', png((1, 2, 3)))
+    assert history.query() == []
+
+def test_record_and_list_newest_first():
+    history.record('e-z-grim', png((255, 0, 0)), url='https://i.e-z.host/first.png', image_format='png')
+    history.record('e-z-grim', png((0, 255, 0)), url='https://i.e-z.host/second.png', image_format='png')
+
+    rows = history.query()
+    assert urls(rows) == ['https://i.e-z.host/second.png', 'https://i.e-z.host/first.png']
+    assert (rows[0]['width'], rows[0]['height'], rows[0]['format']) == (600, 400, 'png')
+    assert os.path.exists(rows[0]['thumbnail'])
+    with Image.open(rows[0]['thumbnail']) as thumbnail:
+        assert max(thumbnail.size) <= history.THUMBNAIL_SIZE
+
+def test_search_matches_text_anywhere_in_the_url_or_path(tmp_path):
+    saved = tmp_path / 'holiday-shot.png'
+    saved.write_bytes(png((0, 0, 255)))
+    history.record('e-z-grim', path=str(saved))
+    history.record('e-z-grim', png((9, 9, 9)), url='https://i.e-z.host/abcdef.png')
+
+    assert urls(history.query('cde')) == ['https://i.e-z.host/abcdef.png']
+    assert [row['path'] for row in history.query('iday')] == [str(saved)]
+    # Too short for the trigram index, so this one is a scan
+    assert urls(history.query('ab')) == ['https://i.e-z.host/abcdef.png']
+    assert history.query('nowhere') == []
+
+def test_query_by_file_finds_its_uploads(tmp_path):
+    data = png((50, 60, 70))
+    copy = tmp_path / 'copy.png'
+    copy.write_bytes(data)
+    history.record('e-z-grim', data, url='https://i.e-z.host/match.png')
+    history.record('e-z-grim', png((1, 1, 1)), url='https://i.e-z.host/other.png')
+
+    assert urls(history.query(str(copy))) == ['https://i.e-z.host/match.png']
+
+def test_old_entries_are_pruned_with_their_thumbnails():
+    settings = history.settings_from_config({'history_max_entries': 2})
+    for index in range(4):
+        history.record('e-z-grim', png((index, 0, 0)), url=f"https://i.e-z.host/shot{index}.png", settings=settings)
+
+    assert urls(history.query()) == ['https://i.e-z.host/shot3.png', 'https://i.e-z.host/shot2.png']
+    assert len(os.listdir(history.THUMBNAIL_DIR)) == 2
+    # The text index forgets pruned rows too
+    assert history.query('shot0') == []
+
+def test_rows_past_the_age_limit_are_pruned():
+    history.record('e-z-grim', png((1, 0, 0)), url='https://i.e-z.host/old.png')
+    connection = sqlite3.connect(history.HISTORY_DB)
+    with connection:
+        connection.execute('UPDATE shots SET created = created - 10 * 86400')
+    connection.close()
+
+    history.record('e-z-grim', png((2, 0, 0)), url='https://i.e-z.host/new.png',
+                   settings=history.settings_from_config({'history_max_age_days': 5}))
+    assert urls(history.query()) == ['https://i.e-z.host/new.png']
+
+def test_format_entries():
+    assert history.format_entries([]) == "No screenshots in the history match."
+    history.record('e-z-grim', png((3, 3, 3)), path='/tmp/saved.png', url=None)
+    assert '(not uploaded)  /tmp/saved.png' in history.format_entries(history.query())
+
+@pytest.mark.parametrize('config, expected', [({}, True), ({'history': 'false'}, False), ({'history': 'True'}, True)])
+def test_enabled(config, expected):
+    assert history.enabled(config) is expected
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+from PIL import Image
+
+from ezshot import redact
+
+@pytest.mark.parametrize('text, expected', [
+    ('10,20,30,40', (10, 20, 40, 60)),
+    ('10,20 30x40', (10, 20, 40, 60)),
+    (' 10, 20, 30, 40 ', (10, 20, 40, 60)),
+    ('-5,0,10,10', (-5, 0, 5, 10)),
+])
+def test_box(text, expected):
+    assert redact.box(text) == expected
+
+@pytest.mark.parametrize('text', ['10,20,30', '1,2,3,4,5', '10,20,0,40', '10,20,30,-1', 'token'])
+def test_box_rejects_malformed_text(text):
+    with pytest.raises(ValueError):
+        redact.box(text)
+
+def test_settings_from_config():
+    assert redact.settings_from_config({}) == {'mode': 'pixelate', 'strength': 16}
+    assert redact.settings_from_config({'redact_mode': 'blur', 'redact_strength': '8'}) == {'mode': 'blur', 'strength': 8}
+    assert redact.settings_from_config({'redact_mode': 'blur'}, mode='pixelate')['mode'] == 'pixelate'
+    with pytest.raises(ValueError):
+        redact.settings_from_config({'redact_mode': 'smudge'})
+
+@pytest.mark.parametrize('mode', redact.MODES)
+def test_apply_only_touches_the_box(mode):
+    rng = random.Random(3)
+    image = Image.frombytes('RGB', (64, 64), bytes(rng.getrandbits(8) for _ in range(64 * 64 * 3)))
+    original = image.copy()
+
+    redact.apply(image, [redact.box('16,16,32,32'), redact.box('60,60,40,40')], redact.settings_from_config({}, mode))
+    assert image.crop((16, 16, 48, 48)).tobytes() != original.crop((16, 16, 48, 48)).tobytes()
+    assert image.crop((0, 0, 64, 16)).tobytes() == original.crop((0, 0, 64, 16)).tobytes()
+    assert image.crop((0, 48, 60, 60)).tobytes() == original.crop((0, 48, 60, 60)).tobytes()
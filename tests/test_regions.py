@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from ezshot import regions
+
+def test_format_geometry_matches_slurp():
+    assert regions.format_geometry(10, 20, 300, 400) == '10,20 300x400'
+
+def test_last_region_is_remembered_for_the_session():
+    assert regions.last() is None
+    regions.remember('0,0 100x100')
+    regions.remember('5,5 50x50')
+    assert regions.last() == '5,5 50x50'
+
+def test_sway_window_is_found_in_the_tree(monkeypatch):
+    tree = {'type': 'root', 'nodes': [{'type': 'output', 'nodes': [{'type': 'workspace', 'nodes': [
+        {'type': 'con', 'rect': {'x': 0, 'y': 0, 'width': 10, 'height': 10}},
+    ], 'floating_nodes': [
+        {'type': 'floating_con', 'focused': True, 'rect': {'x': 100, 'y': 50, 'width': 640, 'height': 480}},
+    ]}]}]}
+    monkeypatch.setattr(regions, '_run', lambda command: json.dumps(tree))
+    assert regions._sway_window() == '100,50 640x480'
+
+def test_sway_ignores_a_focused_workspace(monkeypatch):
+    tree = {'type': 'root', 'nodes': [{'type': 'workspace', 'focused': True, 'rect': {}}]}
+    monkeypatch.setattr(regions, '_run', lambda command: json.dumps(tree))
+    assert regions._sway_window() is None
+
+def test_hyprland_window(monkeypatch):
+    monkeypatch.setattr(regions, '_run', lambda command: json.dumps({'at': [12, 34], 'size': [800, 600]}))
+    assert regions._hyprland_window() == '12,34 800x600'
+    monkeypatch.setattr(regions, '_run', lambda command: '{}')
+    assert regions._hyprland_window() is None
+
+def test_x11_window(monkeypatch):
+    output = "WINDOW=123\nX=7\nY=8\nWIDTH=900\nHEIGHT=700\nSCREEN=0\n"
+    monkeypatch.setattr(regions, '_run', lambda command: output)
+    assert regions._x11_window() == '7,8 900x700'
+
+def test_focused_window_remembers_the_backend_that_worked(monkeypatch):
+    calls = []
+
+    def backend(name, geometry):
+        def query():
+            calls.append(name)
+            return geometry
+        return query
+
+    monkeypatch.setattr(regions, 'WINDOW_BACKENDS', {
+        'sway': ('sh', 'EZSHOT_TEST_SWAY', backend('sway', None)),
+        'x11': ('sh', 'EZSHOT_TEST_X11', backend('x11', '1,2 3x4')),
+    })
+    monkeypatch.setenv('EZSHOT_TEST_SWAY', '1')
+    monkeypatch.setenv('EZSHOT_TEST_X11', '1')
+
+    assert regions.focused_window() == '1,2 3x4'
+    assert regions.focused_window() == '1,2 3x4'
+    assert calls == ['sway', 'x11', 'x11']
+
+def test_focused_window_without_any_backend(monkeypatch):
+    monkeypatch.setattr(regions, 'WINDOW_BACKENDS', {'sway': ('sh', 'EZSHOT_TEST_UNSET', lambda: pytest.fail())})
+    monkeypatch.delenv('EZSHOT_TEST_UNSET', raising=False)
+    assert regions.focused_window() is None
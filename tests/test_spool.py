@@ -0,0 +1,59 @@
+import os
+
+from ezshot import spool
+
+def test_enqueue_writes_image_then_metadata():
+    entry = spool.enqueue(b'image bytes', 'shot.png', 'image/png', {'save_path': '/tmp/shot.png'})
+
+    assert [queued['id'] for queued in spool.pending()] == [entry['id']]
+    assert entry['size'] == len(b'image bytes')
+    assert entry['save_path'] == '/tmp/shot.png'
+    with open(os.path.join(spool.SPOOL_DIR, entry['id'] + '.img'), 'rb') as f:
+        assert f.read() == b'image bytes'
+    assert not [name for name in os.listdir(spool.SPOOL_DIR) if name.endswith('.tmp')]
+
+def test_drain_uploads_every_entry_in_order():
+    first = spool.enqueue(b'one', 'one.png', 'image/png')
+    second = spool.enqueue(b'two', 'two.png', 'image/png')
+    uploaded = []
+
+    def upload(data, entry):
+        return f"https://i.e-z.host/{data.decode()}.png"
+
+    assert spool.drain(upload, lambda url, entry: uploaded.append((entry['id'], url)), concurrency=1)
+    assert uploaded == [(first['id'], 'https://i.e-z.host/one.png'), (second['id'], 'https://i.e-z.host/two.png')]
+    assert spool.pending() == []
+    assert [record['url'] for record in spool.completed()] == [url for _, url in uploaded]
+
+def test_drain_backs_off_when_another_worker_holds_the_queue():
+    spool.enqueue(b'one', 'one.png', 'image/png')
+    held = spool._acquire_worker_lock()
+    try:
+        assert spool.drain(lambda data, entry: 'url', lambda url, entry: None) is False
+    finally:
+        held.close()
+    assert len(spool.pending()) == 1
+
+def test_failed_upload_is_rescheduled_with_backoff():
+    entry = spool.enqueue(b'one', 'one.png', 'image/png')
+
+    def upload(data, entry):
+        raise ConnectionError("network is down")
+
+    spool._process(entry, upload, lambda url, entry: None)
+    [rescheduled] = spool.pending()
+    assert rescheduled['attempts'] == 1
+    assert rescheduled['last_error'] == "network is down"
+    assert rescheduled['next_attempt'] >= rescheduled['created'] + spool.BASE_BACKOFF
+
+def test_permanent_error_moves_the_entry_to_failed():
+    entry = spool.enqueue(b'one', 'one.png', 'image/png')
+
+    def upload(data, entry):
+        raise spool.PermanentError("API key rejected")
+
+    spool._process(entry, upload, lambda url, entry: None)
+    assert spool.pending() == []
+    [failed] = spool.failed()
+    assert failed['last_error'] == "API key rejected"
+    assert os.path.exists(os.path.join(spool.FAILED_DIR, entry['id'] + '.img'))